@@ -0,0 +1,318 @@
+"""
+Headless batch simulation. Plays many games at once through `GameAgent`, with
+player actions from a script file or a simple bot, at increasing concurrency
+levels, and reports throughput and turn latency for each level.
+
+    python -m benchmarks.simulate                                  # offline soak test
+    python -m benchmarks.simulate --concurrency 1,8,32 --processes 4
+    python -m benchmarks.simulate --concurrency 1,8,32 --workers 4     # agents in a worker pool
+    python -m benchmarks.simulate --backend openai --actions actions.txt --results runs.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.turns import ACTIONS
+from data import GameState
+from llm.agent import AgentRuntime, GameAgent
+from llm.catalog import CHARACTERS, ENVIRONMENTS
+from llm.events import EndGame, Error, GameStateUpdate, TextDelta
+from llm.scheduler import LLMScheduler
+from llm.workers import AgentWorkerPool, RemoteAgent
+
+# Bot moves; "{item}" is filled with one of the character's items
+BOT_ACTIONS = ACTIONS + [
+    "I look around.",
+    "I use my {item}.",
+    "I show my {item} to the nearest stranger.",
+    "I run away.",
+]
+
+
+def bot_action(state: GameState, rng: random.Random) -> str:
+    """Picks a plausible next action for the character."""
+    action = rng.choice(BOT_ACTIONS)
+    items = [item.name for item in state.character.items if item.name]
+    if "{item}" in action:
+        action = action.format(item=rng.choice(items)) if items else "I look around."
+    return action
+
+
+def build_runtime(backend: str, workers: int) -> AgentRuntime:
+    """One runtime per process, shared by all its games, as in the server."""
+    scheduler = None
+    if backend == "fake":
+        # The offline model has no rate limits to respect
+        scheduler = LLMScheduler(
+            requests_per_minute=10**9, tokens_per_minute=10**12, max_concurrency=10**6
+        )
+    return AgentRuntime(backend=backend, background_workers=workers, scheduler=scheduler)
+
+
+def build_agent_pool(backend: str, workers: int) -> AgentWorkerPool:
+    """
+    Agent worker processes, as in the server; they take their settings from the
+    environment. Like the games run in this process, they use no scene pool.
+    """
+    os.environ["LLM_BACKEND"] = backend
+    if backend == "fake":
+        os.environ.update(
+            LLM_REQUESTS_PER_MINUTE=str(10**9),
+            LLM_TOKENS_PER_MINUTE=str(10**12),
+            LLM_MAX_CONCURRENCY=str(10**6),
+        )
+    pool = AgentWorkerPool(workers)
+    pool.start()
+    pool.wait_ready()
+    return pool
+
+
+async def play_game(
+    runtime: Optional[AgentRuntime],
+    game: int,
+    turns: int,
+    fast_turns: bool,
+    script: Optional[list[str]],
+    agent_pool: Optional[AgentWorkerPool] = None,
+) -> dict:
+    """Plays one game, in this process or in `agent_pool`, and returns its compact result."""
+    rng = random.Random(game)
+    state = GameState(
+        character=rng.choice(CHARACTERS).model_copy(deep=True),
+        environment=rng.choice(ENVIRONMENTS).model_copy(deep=True),
+    )
+    if agent_pool:
+        agent = RemoteAgent(agent_pool, state, fast_turns=fast_turns, journal_dir=None)
+    else:
+        agent = GameAgent(state, fast_turns=fast_turns, runtime=runtime)
+    result = {
+        "game": game,
+        "character": state.character.name,
+        "environment": state.environment.name,
+        "turn_ms": [],
+        "first_token_ms": [],
+        "errors": 0,
+    }
+
+    start = time.perf_counter()
+    async for event in agent.agenerate_opening_scene():
+        if isinstance(event, Error):
+            result["errors"] += 1
+            result["error"] = event.content
+    result["opening_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    for turn in range(turns):
+        if state.game_over:
+            break
+        action = script[turn % len(script)] if script else bot_action(state, rng)
+        start = time.perf_counter()
+        first_token = None
+        async for event in agent.aprocess_user_action(action, state):
+            match event:
+                case TextDelta():
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                case GameStateUpdate():
+                    state.apply(event)
+                case EndGame():
+                    state.game_over = True
+                case Error(content=content):
+                    result["errors"] += 1
+                    result["error"] = content
+        result["turn_ms"].append(round((time.perf_counter() - start) * 1000, 1))
+        if first_token is not None:
+            result["first_token_ms"].append(round((first_token - start) * 1000, 1))
+    await agent.aclose()
+    return result
+
+
+async def run_games(
+    games: list[int],
+    concurrency: int,
+    turns: int,
+    fast_turns: bool,
+    backend: str,
+    script: Optional[list[str]],
+) -> list[dict]:
+    """Plays `games` with at most `concurrency` running at once."""
+    runtime = build_runtime(backend, workers=max(4, concurrency))
+    limit = asyncio.Semaphore(concurrency)
+
+    async def worker(game: int) -> dict:
+        async with limit:
+            return await play_game(runtime, game, turns, fast_turns, script)
+
+    try:
+        return await asyncio.gather(*(worker(game) for game in games))
+    finally:
+        # Each level runs on a new event loop, so its connections go with it
+        await runtime.aclose()
+
+
+async def run_pooled_games(
+    games: list[int],
+    concurrency: int,
+    turns: int,
+    fast_turns: bool,
+    agent_pool: AgentWorkerPool,
+    script: Optional[list[str]],
+) -> list[dict]:
+    """Plays `games` with their agents in `agent_pool`, at most `concurrency` at once."""
+    limit = asyncio.Semaphore(concurrency)
+
+    async def worker(game: int) -> dict:
+        async with limit:
+            return await play_game(None, game, turns, fast_turns, script, agent_pool)
+
+    return await asyncio.gather(*(worker(game) for game in games))
+
+
+def _run_in_process(args: tuple) -> list[dict]:
+    return asyncio.run(run_games(*args))
+
+
+def run_level(
+    concurrency: int,
+    games: int,
+    processes: int,
+    turns: int,
+    fast_turns: bool,
+    backend: str,
+    script: Optional[list[str]],
+    first_game: int = 0,
+    agent_pool: Optional[AgentWorkerPool] = None,
+) -> tuple[list[dict], float]:
+    """
+    Plays one concurrency level, split across `processes` or with the agents in
+    `agent_pool`; returns results and seconds.
+    """
+    ids = list(range(first_game, first_game + games))
+    start = time.perf_counter()
+    if agent_pool:
+        results = asyncio.run(
+            run_pooled_games(ids, concurrency, turns, fast_turns, agent_pool, script)
+        )
+    elif processes <= 1:
+        results = asyncio.run(run_games(ids, concurrency, turns, fast_turns, backend, script))
+    else:
+        shards = [ids[i::processes] for i in range(processes)]
+        per_process = max(1, concurrency // processes)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = [
+                result
+                for shard in pool.map(
+                    _run_in_process,
+                    [
+                        (shard, per_process, turns, fast_turns, backend, script)
+                        for shard in shards
+                        if shard
+                    ],
+                )
+                for result in shard
+            ]
+    return results, time.perf_counter() - start
+
+
+def summarize(concurrency: int, results: list[dict], seconds: float) -> dict:
+    """Throughput, latency percentiles and failure rate for one level."""
+    turn_ms = sorted(ms for result in results for ms in result["turn_ms"])
+    first_token_ms = sorted(ms for result in results for ms in result["first_token_ms"])
+    turns = len(turn_ms)
+    return {
+        "concurrency": concurrency,
+        "games": len(results),
+        "turns": turns,
+        "seconds": round(seconds, 2),
+        "turns_per_second": round(turns / seconds, 2) if seconds else 0.0,
+        "turn_ms_p50": _percentile(turn_ms, 0.50),
+        "turn_ms_p95": _percentile(turn_ms, 0.95),
+        "turn_ms_p99": _percentile(turn_ms, 0.99),
+        "first_token_ms_p50": _percentile(first_token_ms, 0.50),
+        "failure_rate": round(
+            sum(result["errors"] for result in results) / max(1, turns + len(results)), 4
+        ),
+    }
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many headless games at once.")
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,16,64",
+        help="Comma-separated concurrency levels to ramp through.",
+    )
+    parser.add_argument("--games", type=int, help="Games per level (default: 2 x concurrency).")
+    parser.add_argument("--turns", type=int, default=10, help="Turns per game.")
+    parser.add_argument("--processes", type=int, default=1, help="Processes per level.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run the agents in this many agent worker processes (see llm.workers).",
+    )
+    parser.add_argument("--fast-turns", action="store_true")
+    parser.add_argument(
+        "--backend",
+        default="fake",
+        help="Model backend (see LLM_BACKEND); the offline one by default.",
+    )
+    parser.add_argument(
+        "--actions", type=Path, help="File of player actions, one per line, used in order."
+    )
+    parser.add_argument("--results", type=Path, help="Append per-game results to this JSONL file.")
+    args = parser.parse_args()
+
+    script = None
+    if args.actions:
+        script = [line.strip() for line in args.actions.read_text().splitlines() if line.strip()]
+
+    agent_pool = build_agent_pool(args.backend, args.workers) if args.workers else None
+    first_game = 0
+    print(
+        f"{'conc':>5} {'games':>6} {'turns':>6} {'turns/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fail':>6}"
+    )
+    try:
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            games = args.games or 2 * concurrency
+            results, seconds = run_level(
+                concurrency,
+                games,
+                args.processes,
+                args.turns,
+                args.fast_turns,
+                args.backend,
+                script,
+                first_game,
+                agent_pool,
+            )
+            first_game += games
+            summary = summarize(concurrency, results, seconds)
+            print(
+                f"{concurrency:>5} {summary['games']:>6} {summary['turns']:>6} "
+                f"{summary['turns_per_second']:>8} {summary['turn_ms_p50']:>8} "
+                f"{summary['turn_ms_p95']:>8} {summary['turn_ms_p99']:>8} "
+                f"{summary['failure_rate']:>6.1%}"
+            )
+            if args.results:
+                args.results.parent.mkdir(parents=True, exist_ok=True)
+                with args.results.open("a") as f:
+                    f.write(json.dumps({"summary": summary}) + "\n")
+                    for result in results:
+                        f.write(json.dumps({"concurrency": concurrency, **result}) + "\n")
+    finally:
+        if agent_pool:
+            agent_pool.shutdown()
@@ -0,0 +1,136 @@
+"""
+Startup benchmark. Measures how long `python main.py` takes to paint the title
+screen, reports the slowest imports from `python -X importtime`, and checks that
+the model stack stays out of the startup path.
+
+    python -m benchmarks.startup                     # run and check for regressions
+    python -m benchmarks.startup --update-baseline   # accept the current numbers
+
+A baseline is not written while the model stack leaks into startup, unless
+`--force` is also given.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).with_name("startup_baseline.json")
+
+# Modules that belong to the background warm-up, never to first paint
+DEFERRED_MODULES = ["llm.agent", "langchain", "langchain_core", "langchain_openai", "openai", "langgraph"]
+
+# Paints the title screen the way `main.py` does, then reports what was imported
+FIRST_PAINT_SCRIPT = """
+import io, sys
+from rich.console import Console
+import main
+main.Game(console=Console(file=io.StringIO())).show_title()
+print("painted", flush=True)
+print(",".join(m for m in {deferred!r} if m in sys.modules), flush=True)
+"""
+
+# Allowed ratio over the baseline, plus an absolute allowance in ms for noise
+TOLERANCES = {
+    "first_paint_ms_p50": (1.3, 50.0),
+    "import_ms": (1.3, 50.0),
+}
+
+
+def time_first_paint() -> tuple[float, list[str]]:
+    """Runs a fresh interpreter up to the title screen; returns ms and deferred modules loaded."""
+    script = FIRST_PAINT_SCRIPT.format(deferred=DEFERRED_MODULES)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", script], cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    process.stdout.readline()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    loaded = process.stdout.readline().strip()
+    process.wait()
+    if process.returncode:
+        raise RuntimeError("The first paint script failed")
+    return elapsed_ms, [m for m in loaded.split(",") if m]
+
+
+def import_times(top: int) -> tuple[float, list[tuple[str, float]]]:
+    """Returns the total `import main` time and the `top` slowest imports (cumulative ms)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(total) / 1000
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+    return cumulative.get("main", 0.0), slowest[1 : top + 1]
+
+
+def find_regressions(results: dict, baseline: dict) -> list[str]:
+    """Lists every metric that got worse than its baseline allows."""
+    regressions = []
+    for name, (ratio, allowance) in TOLERANCES.items():
+        if name in baseline:
+            limit = baseline[name] * ratio + allowance
+            if results[name] > limit:
+                regressions.append(
+                    f"{name}: {results[name]} exceeds {limit:.1f} (baseline {baseline[name]})"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark startup time to first paint.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Number of slow imports to list.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Write the baseline with --update-baseline even if startup regressed.",
+    )
+    args = parser.parse_args()
+
+    paints = [time_first_paint() for _ in range(args.runs)]
+    import_ms, slowest = import_times(args.top)
+    results = {
+        "first_paint_ms_p50": round(statistics.median(ms for ms, _ in paints), 1),
+        "import_ms": round(import_ms, 1),
+    }
+    loaded = sorted({m for _, modules in paints for m in modules})
+
+    for name, value in results.items():
+        print(f"{name:<22} {value}")
+    print("Slowest imports (cumulative ms):")
+    for name, ms in slowest:
+        print(f"  {name:<40} {ms:.1f}")
+
+    regressions = []
+    if loaded:
+        regressions.append(f"deferred modules imported before first paint: {', '.join(loaded)}")
+
+    if args.update_baseline and regressions and not args.force:
+        print("Not writing the baseline while startup regressed; pass --force to write it anyway.")
+    elif args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline.exists():
+        regressions += find_regressions(results, json.loads(args.baseline.read_text()))
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline first.")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,189 @@
+"""
+Turn pipeline benchmark. Plays scripted games against the offline model so that
+every number measures the game's own overhead rather than the API, and compares
+the results with a stored baseline.
+
+    python -m benchmarks.turns                     # run and check for regressions
+    python -m benchmarks.turns --update-baseline   # accept the current numbers
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from data import GameState
+from llm.agent import AgentRuntime, GameAgent
+from llm.catalog import CHARACTERS, ENVIRONMENTS
+from llm.events import Error, Event, GameStateUpdate, Stats
+from llm.fake import ScriptedChatModel, demo_scripts
+from llm.scheduler import LLMScheduler
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+ACTIONS = [
+    "I leap over the hedge.",
+    "I ask the goose for directions.",
+    "I search the bushes for the hat.",
+    "I bribe the guard with a biscuit.",
+    "I climb the nearest tower.",
+]
+
+# Allowed ratio over the baseline, plus an absolute allowance for noise
+TOLERANCES = {
+    "turn_ms_p50": (1.5, 1.0),
+    "turn_ms_p95": (1.5, 2.0),
+    "opening_ms": (1.5, 5.0),
+    "prompt_tokens_last": (1.1, 0),
+    "prompt_tokens_max": (1.1, 0),
+    "memory_kb_per_turn": (1.5, 2.0),
+    "peak_memory_kb": (1.3, 256),
+}
+
+
+def play_game(fast_turns: bool, turns: int, latency: float, token_delay: float) -> dict:
+    """Plays one scripted game and returns its per-turn measurements."""
+    runtime = AgentRuntime(
+        llm=ScriptedChatModel(
+            scripts=demo_scripts(), latency=latency, token_delay=token_delay
+        ),
+        # Only the pipeline is under test, so rate limits stay out of the way
+        scheduler=LLMScheduler(requests_per_minute=10**9, tokens_per_minute=10**12),
+    )
+    state = GameState(
+        character=CHARACTERS[0].model_copy(deep=True),
+        environment=ENVIRONMENTS[0].model_copy(deep=True),
+    )
+    agent = GameAgent(state, fast_turns=fast_turns, runtime=runtime)
+
+    start = time.perf_counter()
+    for event in agent.generate_opening_scene():
+        _check(event)
+    opening_ms = (time.perf_counter() - start) * 1000
+
+    turn_ms, prompt_tokens, memory_kb = [], [], []
+    for turn in range(turns):
+        start = time.perf_counter()
+        for event in agent.process_user_action(ACTIONS[turn % len(ACTIONS)], state):
+            _check(event)
+            match event:
+                case GameStateUpdate():
+                    state.apply(event)
+                case Stats(kind="turn_stats", values=values):
+                    prompt_tokens.append(values["prompt_tokens"])
+        turn_ms.append((time.perf_counter() - start) * 1000)
+        if tracemalloc.is_tracing():
+            memory_kb.append(tracemalloc.get_traced_memory()[0] / 1024)
+
+    runtime.background.shutdown(wait=True)
+    runtime.scheduler.close()
+    return {
+        "opening_ms": opening_ms,
+        "turn_ms": turn_ms,
+        "prompt_tokens": prompt_tokens,
+        "memory_kb": memory_kb,
+    }
+
+
+def run_benchmark(
+    fast_turns: bool, games: int, turns: int, latency: float, token_delay: float
+) -> dict:
+    """Times `games` games, then replays one under tracemalloc for the memory figures."""
+    results = [play_game(fast_turns, turns, latency, token_delay) for _ in range(games)]
+    turn_ms = sorted(ms for result in results for ms in result["turn_ms"])
+    prompt_tokens = results[0]["prompt_tokens"]
+
+    tracemalloc.start()
+    try:
+        memory_kb = play_game(fast_turns, turns, latency, token_delay)["memory_kb"]
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+    # Growth over the second half of the game, once the memory window is full
+    half = len(memory_kb) // 2
+
+    return {
+        "turn_ms_p50": round(statistics.median(turn_ms), 3),
+        "turn_ms_p95": round(turn_ms[int(len(turn_ms) * 0.95)], 3),
+        "opening_ms": round(statistics.median(r["opening_ms"] for r in results), 3),
+        "prompt_tokens_first": prompt_tokens[0],
+        "prompt_tokens_last": prompt_tokens[-1],
+        "prompt_tokens_max": max(prompt_tokens),
+        "memory_kb_per_turn": round(
+            (memory_kb[-1] - memory_kb[half]) / max(1, len(memory_kb) - 1 - half), 3
+        ),
+        "peak_memory_kb": round(peak_kb, 1),
+    }
+
+
+def find_regressions(results: dict, baseline: dict) -> list[str]:
+    """Lists every metric that got worse than its baseline allows."""
+    regressions = []
+    for engine, metrics in results.items():
+        for name, value in metrics.items():
+            if name not in TOLERANCES or name not in baseline.get(engine, {}):
+                continue
+            ratio, allowance = TOLERANCES[name]
+            limit = baseline[engine][name] * ratio + allowance
+            if value > limit:
+                regressions.append(
+                    f"{engine}.{name}: {value} exceeds {limit:.3f} "
+                    f"(baseline {baseline[engine][name]})"
+                )
+    return regressions
+
+
+def _check(event: Event):
+    if isinstance(event, Error):
+        raise RuntimeError(event.content)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the turn pipeline offline.")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds to first token.")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Simulated seconds per token.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    settings = {
+        "turns": args.turns,
+        "games": args.games,
+        "latency": args.latency,
+        "token_delay": args.token_delay,
+    }
+    results = {
+        engine: run_benchmark(
+            engine == "fast", args.games, args.turns, args.latency, args.token_delay
+        )
+        for engine in ("graph", "fast")
+    }
+    for engine, metrics in results.items():
+        print(f"[{engine}]")
+        for name, value in metrics.items():
+            print(f"  {name:<22} {value}")
+
+    if args.update_baseline:
+        args.baseline.write_text(
+            json.dumps({"settings": settings, **results}, indent=2) + "\n"
+        )
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline first.")
+        sys.exit(0)
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("settings") != settings:
+        print("Baseline was recorded with different settings; not comparing.")
+        sys.exit(0)
+
+    regressions = find_regressions(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
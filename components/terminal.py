@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import Optional
+
+from rich.console import Console, RenderableType, RenderHook
+from rich.control import Control, ControlType
+from rich.panel import Panel
+from rich.segment import Segment, Segments
+
+# Cursor codes that clear the rest of the current line, or all of it
+_ERASE_TO_END = Control((ControlType.ERASE_IN_LINE, 0)).segment
+_ERASE_LINE_CODE = (ControlType.ERASE_IN_LINE, 2)
+_ERASE_LINE = Control(_ERASE_LINE_CODE).segment
+
+
+class CountingOutput:
+    """
+    File-like wrapper that counts the bytes a console writes to its terminal.
+    Everything else is passed through to the wrapped file.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode("utf-8", errors="replace"))
+        return self.file.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class StatusPane:
+    """Prints the status panel only when its contents differ from the last one shown."""
+
+    def __init__(self, console: Console):
+        self.console = console
+        self._shown: Optional[str] = None
+
+    def show(self, text: str, **panel_options) -> bool:
+        """Prints `text` in a panel unless it is already on screen; returns whether it did."""
+        if text == self._shown:
+            return False
+        self._shown = text
+        self.console.print(Panel(text, **panel_options))
+        return True
+
+
+class LiveRegion(RenderHook):
+    """
+    The bottom of the terminal as an area that is redrawn in place, in the
+    manner of Rich's `Live`, with two differences. Updates are coalesced to at
+    most `max_fps` paints a second, with a trailing paint so that the last
+    update always shows; and a paint only rewrites the lines from the first one
+    that changed, so streaming text at the end of a panel costs a line or two
+    per frame rather than the whole panel. Anything printed to the console
+    while the region is open appears above it. Must be used from the event
+    loop that owns the console.
+    """
+
+    def __init__(self, console: Console, renderable: RenderableType, max_fps: float = 15):
+        self.console = console
+        self.interval = 1 / max_fps
+        self.paints = 0
+        self.paint_seconds = 0.0
+        self._renderable = renderable
+        self._lines: list[list[Segment]] = []
+        self._painting = False
+        self._last_paint = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __enter__(self) -> "LiveRegion":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.console.push_render_hook(self)
+        if self.console.is_interactive:
+            self.console.show_cursor(False)
+            self.refresh()
+
+    def stop(self):
+        """Paints any pending update and leaves the final frame on screen."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.console.pop_render_hook()
+        if self.console.is_interactive:
+            self.refresh()
+            self.console.line()
+            self.console.show_cursor(True)
+        else:
+            # Files and dumb terminals get the final frame only
+            self.console.print(self._renderable)
+
+    def update(self, renderable: RenderableType):
+        """Replaces the contents; they are painted now or at the next frame."""
+        self._renderable = renderable
+        if not self.console.is_interactive:
+            return
+        wait = self._last_paint + self.interval - time.monotonic()
+        if wait <= 0:
+            self.refresh()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self.refresh()
+
+    def refresh(self):
+        """Paints the current contents, rewriting only the lines that changed."""
+        start = time.perf_counter()
+        lines = self.console.render_lines(self._renderable, pad=False)
+        segments = self._diff(self._lines, lines)
+        self._lines = lines
+        self._last_paint = time.monotonic()
+        if segments:
+            self._painting = True
+            try:
+                self.console.print(Segments(segments), end="")
+            finally:
+                self._painting = False
+            self.paints += 1
+        self.paint_seconds += time.perf_counter() - start
+
+    def _diff(self, old: list[list[Segment]], new: list[list[Segment]]) -> list[Segment]:
+        """
+        Segments that turn the frame `old` into `new`, starting and ending with
+        the cursor at the end of the frame's last line.
+        """
+        if not old:
+            return self._lines_from(new, 0)
+        first = next(
+            (i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new))
+        )
+        if first == len(old) == len(new):
+            return []
+        # Lines above `top` have scrolled off the screen and cannot be reached
+        top = max(0, len(old) - self.console.height)
+        if first < top or len(new) <= top:
+            # Redraw the whole frame from the top of the screen; what scrolled
+            # away stays as it was
+            segments = [Control.move_to_column(0, top - len(old) + 1).segment]
+            segments.extend(self._lines_from(new, 0))
+            extra = len(old) - top - len(new)
+        else:
+            if first == len(old):
+                segments = [Segment.line()]
+            elif first < len(new):
+                segments = [Control.move_to_column(0, first - len(old) + 1).segment]
+            else:
+                # The new frame is a shorter copy of the old one
+                segments = [
+                    Control.move_to_column(
+                        Segment.get_line_length(new[-1]), len(new) - len(old)
+                    ).segment
+                ]
+            segments.extend(self._lines_from(new, first))
+            extra = len(old) - len(new)
+        if extra > 0:
+            for _ in range(extra):
+                segments.extend([Segment.line(), _ERASE_LINE])
+            segments.append(
+                Control.move_to_column(Segment.get_line_length(new[-1]), -extra).segment
+            )
+        return segments
+
+    def _lines_from(self, lines: list[list[Segment]], first: int) -> list[Segment]:
+        segments = []
+        for index in range(first, len(lines)):
+            if index > first:
+                segments.append(Segment.line())
+            segments.extend(lines[index])
+            # Clear what is left of a longer old line; after a full-width line the
+            # cursor still sits on the last character, which must stay
+            if Segment.get_line_length(lines[index]) < self.console.width:
+                segments.append(_ERASE_TO_END)
+        return segments
+
+    def process_renderables(self, renderables: list) -> list:
+        """Moves other output above the region and redraws the region below it."""
+        if self._painting or not self.console.is_interactive:
+            return renderables
+        clear = Control()
+        if self._lines:
+            up = min(len(self._lines), self.console.height) - 1
+            clear = Control(
+                ControlType.CARRIAGE_RETURN,
+                _ERASE_LINE_CODE,
+                *(((ControlType.CURSOR_UP, 1), _ERASE_LINE_CODE) * up),
+            )
+        self._lines = self.console.render_lines(self._renderable, pad=False)
+        self._last_paint = time.monotonic()
+        return [clear, *renderables, Segments(self._lines_from(self._lines, 0))]
+
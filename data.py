@@ -1,5 +1,43 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from pydantic import BaseModel, PrivateAttr
+from rich.markup import render
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from llm.events import GameStateUpdate
+
+# Optional cap, in estimated tokens, on each long catalog text the model sees
+MODEL_TEXT_TOKEN_BUDGET = int(os.getenv("MODEL_TEXT_TOKEN_BUDGET", 0)) or None
+
+
+@lru_cache(maxsize=1024)
+def model_text(text: str, token_budget: Optional[int] = None) -> str:
+    """
+    Model-facing version of authored catalog text: Rich markup stripped, then
+    trimmed as by `trim_text`. Only for text written with markup; text from the
+    model is not markup and may not parse as it.
+    """
+    return trim_text(render(text).plain, token_budget)
+
+
+def trim_text(text: str, token_budget: Optional[int] = None) -> str:
+    """
+    Text with its whitespace collapsed and, given a budget, cut to the whole
+    sentences that fit in it (about four characters per token).
+    """
+    plain = " ".join(text.split())
+    if token_budget is None or len(plain) <= token_budget * 4:
+        return plain
+    kept = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", plain):
+        if kept and len(kept) + len(sentence) + 1 > token_budget * 4:
+            break
+        kept = f"{kept} {sentence}" if kept else sentence
+    return kept
 
 
 class Item(BaseModel):
@@ -18,6 +56,47 @@ class Character(BaseModel):
     feeling: str = ""
     embarrassment: int = 0
 
+    _model_view: Optional["Character"] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_catalog(cls, entry: dict) -> "Character":
+        """
+        Builds a catalog character. Its items are copied into the game state and
+        sit beside items the model invents, so their markup is stripped here,
+        once, and item text is never parsed as markup again.
+        """
+        character = cls(**entry)
+        for item in character.items:
+            item.name = model_text(item.name)
+            item.description = model_text(item.description)
+            item.property = model_text(item.property)
+        return character
+
+    def model_view(self) -> "Character":
+        """
+        Copy of the character with its catalog text in model-facing form (see
+        `model_text`). Built on first use and kept, so copies of a catalog entry
+        share the work done at load; only the static fields are projected.
+        Item text is plain already (see `from_catalog`) and is only trimmed.
+        """
+        if self._model_view is None:
+            self._model_view = self.model_copy(
+                update={
+                    "backstory": model_text(self.backstory, MODEL_TEXT_TOKEN_BUDGET),
+                    "strengths": [model_text(s, MODEL_TEXT_TOKEN_BUDGET) for s in self.strengths],
+                    "weaknesses": [model_text(w, MODEL_TEXT_TOKEN_BUDGET) for w in self.weaknesses],
+                    "items": [
+                        Item(
+                            name=item.name,
+                            description=trim_text(item.description, MODEL_TEXT_TOKEN_BUDGET),
+                            property=trim_text(item.property, MODEL_TEXT_TOKEN_BUDGET),
+                        )
+                        for item in self.items
+                    ],
+                }
+            )
+        return self._model_view
+
 
 class Environment(BaseModel):
     name: str = ""
@@ -26,6 +105,19 @@ class Environment(BaseModel):
     challenge: str = ""
     reward: str = ""
 
+    _model_view: Optional["Environment"] = PrivateAttr(default=None)
+
+    def model_view(self) -> "Environment":
+        """Copy of the environment with model-facing text; see `Character.model_view`."""
+        if self._model_view is None:
+            self._model_view = self.model_copy(
+                update={
+                    field: model_text(getattr(self, field), MODEL_TEXT_TOKEN_BUDGET)
+                    for field in ("description", "challenge", "reward")
+                }
+            )
+        return self._model_view
+
 
 class GameState(BaseModel):
     character: Character = Character()
@@ -33,3 +125,95 @@ class GameState(BaseModel):
     mission_description: Optional[str] = None
     mission_summary: Optional[str] = None
     game_over: bool = False
+
+    # The volatile state as the model last saw it (see `mark_clean`)
+    _clean_state: Optional[dict] = PrivateAttr(default=None)
+
+    def character_sheet(self) -> str:
+        """
+        The parts of the state that stay fixed for the whole session, formatted once
+        so they can sit in the cacheable prefix of every prompt.
+        """
+        character = self.character.model_view()
+        environment = self.environment.model_view()
+        return (
+            f"Character: {character.name} the {character.class_name}\n"
+            f"Backstory: {character.backstory}\n"
+            f"Strengths: {'; '.join(character.strengths)}\n"
+            f"Weaknesses: {'; '.join(character.weaknesses)}\n"
+            f"Environment: {environment.name} ({environment.type})\n"
+            f"Description: {environment.description}\n"
+            f"Challenge: {environment.challenge}\n"
+            f"Reward: {environment.reward}\n"
+            f"Mission: {self.mission_description}"
+        )
+
+    def apply(self, update: "GameStateUpdate"):
+        """Applies a state change from the agent; fields left empty are unchanged."""
+        if update.feeling:
+            self.character.feeling = update.feeling
+        if update.new_item_name:
+            self.character.items.append(
+                Item(name=update.new_item_name, description=update.new_item_description or "")
+            )
+        if update.embarrassment:
+            self.character.embarrassment += update.embarrassment
+
+    def volatile_state(self) -> dict:
+        """The fields that change during play, in model-facing form."""
+        character = self.character
+        return {
+            "feeling": character.feeling,
+            "embarrassment": character.embarrassment,
+            # Item text is plain (see `Character.from_catalog`) and is passed as it is
+            "items": [
+                {"name": item.name, "description": item.description} for item in character.items
+            ],
+            "game_over": self.game_over,
+        }
+
+    def volatile_json(self) -> str:
+        """Compact, deterministic JSON of the fields that change during play."""
+        return compact_json(self.volatile_state())
+
+    def state_delta(self) -> dict:
+        """
+        The volatile fields changed since the last `mark_clean` (all of them before
+        the first). Items are reported as added and removed rather than in full.
+        Comparing against the clean copy also catches in-place changes such as
+        appending to the item list.
+        """
+        current = self.volatile_state()
+        clean = self._clean_state
+        if clean is None:
+            return current
+
+        delta = {
+            field: value
+            for field, value in current.items()
+            if field != "items" and value != clean.get(field)
+        }
+        # Items are matched on name and description, and counted, so that a changed
+        # description or a second item of the same name is not missed
+        unmatched = Counter((item["name"], item["description"]) for item in clean["items"])
+        added = []
+        for item in current["items"]:
+            key = (item["name"], item["description"])
+            if unmatched[key]:
+                unmatched[key] -= 1
+            else:
+                added.append(item)
+        removed = sorted(name for name, _ in unmatched.elements())
+        if added:
+            delta["items_added"] = added
+        if removed:
+            delta["items_removed"] = removed
+        return delta
+
+    def mark_clean(self, state: Optional[dict] = None):
+        """Records `state` (by default the current one) as known to the model."""
+        self._clean_state = state if state is not None else self.volatile_state()
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True)
@@ -1,32 +1,64 @@
-import os
+import asyncio
+import logging
 import random
 import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    HumanMessage,
+    SystemMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.output_parsers import JsonOutputParser
 from langchain.tools import tool
 from typing import Optional
-from data import GameState
+from data import Character, Environment, GameState, compact_json
+from llm.backends import async_http_client, build_chat_model
+from llm.fast_turn import FastTurnEngine
+from llm.events import Error, Event, MissionSet, Stats, Text, TextDelta
+from llm.graph import TurnGraph
+from llm.journal import JOURNALED_EVENTS, SessionJournal
+from llm.memory import ConversationMemory, estimate_tokens
+from llm.pool import ScenePool
+from llm.resilience import CallPolicy, ResilientChatModel
+from llm.response_cache import response_cache_layer
+from llm.routing import MECHANICS, STORY, ModelRouter, build_routes
+from llm.scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, ScheduledChatModel
+from llm.speculation import Speculation, SpeculativeTurns
+from llm.stats import TurnStats
+from llm.story_index import StoryIndex
 
+logger = logging.getLogger(__name__)
 
-@tool
-def roll_dice(reason: str, sides: int = 20) -> str:
+# Whether a failed background refill of the scene pool has been logged yet
+_refill_failure_logged = False
+
+
+# Tools reply with JSON for the model and the same data as an artifact for the turn
+# events, so the results never need to be parsed back
+@tool(response_format="content_and_artifact")
+def roll_dice(reason: str, sides: int = 20) -> tuple[str, dict]:
     """
     Rolls a dice to determine the outcome of an action. Use this for skill checks,
     attack rolls, or any situation where chance is involved.
     """
-    roll = random.randint(1, sides)
-    return json.dumps({"roll": roll, "reason": reason, "sides": sides})
+    result = {"roll": random.randint(1, sides), "reason": reason, "sides": sides}
+    return json.dumps(result), result
 
 
-@tool
+@tool(response_format="content_and_artifact")
 def update_game_state(
     feeling: Optional[str] = None,
     new_item_name: Optional[str] = None,
     new_item_description: Optional[str] = None,
     embarrassment: Optional[int] = None,
-) -> str:
+) -> tuple[str, dict]:
     """
     Updates the character's state. Use this to change the character's feeling,
     add a new item to their inventory, or update their embarrassment level.
@@ -43,62 +75,264 @@ def update_game_state(
     }
     # Filter out None values
     update_data = {k: v for k, v in update_data.items() if v is not None}
-    return json.dumps(update_data)
+    return json.dumps(update_data), update_data
 
 
-@tool
-def end_game(win: bool, reason: str) -> str:
+@tool(response_format="content_and_artifact")
+def end_game(win: bool, reason: str) -> tuple[str, dict]:
     """
     Ends the game. Call this tool when the player has either won by completing the
     mission or lost by reaching an embarrassment level of 10.
     """
-    return json.dumps({"win": win, "reason": reason})
+    result = {"win": win, "reason": reason}
+    return json.dumps(result), result
+
+
+def _build_turn_prompt() -> ChatPromptTemplate:
+    """
+    Builds the turn prompt. Static text comes first and volatile state last, so every
+    turn shares the longest possible prefix with the previous one for provider
+    prompt caching.
+    """
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are a whimsical and humorous text-based adventure game master. "
+                "Your task is to guide the player through a story, responding to their actions "
+                "with vivid descriptions, engaging challenges, and funny dialogue. "
+                "Keep the tone lighthearted, satirical, and creative. "
+                "Use the roll_dice tool for any action where the outcome is uncertain. "
+                "As the story progresses, use the update_game_state tool to modify the character's "
+                "feeling, inventory, or embarrassment level. Add embarrassment points for failed rolls or bad decisions. "
+                "The game ends in one of two ways: the player loses if their embarrassment level reaches 10, "
+                "or the player wins if they complete their mission. "
+                "When one of these conditions is met, you MUST use the end_game tool. "
+                "When you call update_game_state or end_game, write the narration for the turn "
+                "in that same response.",
+            ),
+            ("system", "Character Sheet:\n{character_sheet}"),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("system", "{game_state}"),
+            ("user", "{input}"),
+            MessagesPlaceholder(variable_name="messages"),
+        ]
+    )
+
+
+class AgentRuntime:
+    """
+    The parts of a GameAgent that hold no per-player state: the model client and
+    its connection pool, the request scheduler, the compiled turn graph, the fast
+    turn engine and the background executor. One runtime serves any number of
+    concurrent agents. Calls are routed by task (see `build_routes`) to models
+    built for `backend` (see `build_chat_model`), or all to `llm` if given, run
+    under `call_policy` (see `CallPolicy`), and `cache_mode` puts a response
+    cache in front of each model (see `response_cache_layer`). The runtime's
+    async HTTP connections belong to the event loop that first uses them, so a
+    runtime is used from one loop and closed with `aclose` before it ends.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        backend: str = "",
+        max_connections: int = 100,
+        background_workers: int = 4,
+        scheduler: Optional[LLMScheduler] = None,
+        cache_mode: str = "",
+        call_policy: Optional[CallPolicy] = None,
+    ):
+        # Every model call from every session goes through the one scheduler;
+        # cache hits are answered before they reach it
+        self.scheduler = scheduler or LLMScheduler.from_env()
+        # Deadlines, retries and hedges apply once a call holds a scheduler slot;
+        # each retry or hedge is charged to the scheduler's rate limits as well
+        self.call_policy = call_policy or CallPolicy.from_env()
+        with_cache = response_cache_layer(cache_mode)
+        self.http_async_client = async_http_client(max_connections)
+
+        def make_model(name: str) -> BaseChatModel:
+            model = ResilientChatModel(
+                inner=llm
+                or build_chat_model(backend, name, max_connections, self.http_async_client),
+                policy=self.call_policy,
+                scheduler=self.scheduler,
+            )
+            return with_cache(ScheduledChatModel(inner=model, scheduler=self.scheduler))
+
+        self.llm = ModelRouter.from_routes(build_routes(make_model))
+        self.tools = [roll_dice, update_game_state, end_game]
+        self.turn_graph = TurnGraph(self.llm, self.tools, _build_turn_prompt())
+        self.fast_turn = FastTurnEngine(self.llm)
+        self.background = ThreadPoolExecutor(
+            max_workers=background_workers, thread_name_prefix="game-agent"
+        )
+
+    async def aclose(self):
+        """
+        Stops the background work and the scheduler, and closes the runtime's async
+        connections.
+        """
+        self.background.shutdown(wait=False, cancel_futures=True)
+        self.scheduler.close()
+        await self.http_async_client.aclose()
+
+
+_shared_runtime: Optional[AgentRuntime] = None
+_shared_runtime_lock = threading.Lock()
+
+
+def shared_runtime() -> AgentRuntime:
+    """Returns the process-wide runtime, creating it on first use."""
+    global _shared_runtime
+    with _shared_runtime_lock:
+        if _shared_runtime is None:
+            _shared_runtime = AgentRuntime()
+        return _shared_runtime
 
 
 class GameAgent:
-    def __init__(self, state: GameState):
+    def __init__(
+        self,
+        state: GameState,
+        pool: Optional[ScenePool] = None,
+        fast_turns: bool = False,
+        runtime: Optional[AgentRuntime] = None,
+        session_id: Optional[str] = None,
+        journal: Optional[SessionJournal] = None,
+    ):
         self.state = state
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini", temperature=0.7, api_key=os.getenv("OPENAI_API_KEY")
+        self.pool = pool
+        self.journal = journal
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.runtime = runtime or shared_runtime()
+        self.llm = self.runtime.llm
+        self.tools = self.runtime.tools
+        self.turn_graph = self.runtime.turn_graph
+        self.fast_turn = self.runtime.fast_turn if fast_turns else None
+        self._background = self.runtime.background
+        self.memory = ConversationMemory(
+            self.llm, self._background, config=self._config(BACKGROUND, MECHANICS)
         )
-        self.tools = [roll_dice, update_game_state, end_game]
-        self.chat_history = []
+        self._mission_future: Optional[Future] = None
+        self._character_sheet: Optional[str] = None
+        # History message holding the last full game state sent to the model
+        self._state_anchor: Optional[SystemMessage] = None
+        self.speculation = SpeculativeTurns()
+        # Story facts that have left the history, recalled by relevance each turn
+        self.story_index = StoryIndex()
 
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    "You are a whimsical and humorous text-based adventure game master. "
-                    "Your task is to guide the player through a story, responding to their actions "
-                    "with vivid descriptions, engaging challenges, and funny dialogue. "
-                    "Keep the tone lighthearted, satirical, and creative. "
-                    "Use the roll_dice tool for any action where the outcome is uncertain. "
-                    "As the story progresses, use the update_game_state tool to modify the character's "
-                    "feeling, inventory, or embarrassment level. Add embarrassment points for failed rolls or bad decisions. "
-                    "The game ends in one of two ways: the player loses if their embarrassment level reaches 10, "
-                    "or the player wins if they complete their mission. "
-                    "When one of these conditions is met, you MUST use the end_game tool.",
-                ),
-                ("system", "Current Game State:\n{game_state}"),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("user", "{input}"),
-                MessagesPlaceholder(variable_name="agent_scratchpad"),
-            ]
+    @classmethod
+    def resume(cls, journal: SessionJournal, **kwargs) -> "GameAgent":
+        """
+        Rebuilds a saved session from its journal (see `SessionJournal.load`)
+        without calling the model. The next turn sends the full game state again.
+        """
+        record = journal.load()
+        state = GameState.model_validate(record["state"])
+        agent = cls(state, session_id=journal.session_id, journal=journal, **kwargs)
+        memory = record["memory"]
+        agent.memory.restore(
+            memory["summary"], [messages_from_dict(turn) for turn in memory["turns"]]
         )
+        entries = record["entries"]
+        if record["index"] is not None:
+            agent.story_index.restore(record["index"])
+        elif journal.snapshot_path.exists():
+            # A snapshot without the index: rebuild it from the whole journal
+            entries = journal.entries()
+        for entry in entries:
+            agent.story_index.add_turn(entry.get("events", []), entry.get("input"))
+        return agent
+
+    def _config(self, priority: str, route: str = STORY) -> dict:
+        """
+        Run config that tells the scheduler who is asking and how urgently, and the
+        router which kind of model the call needs.
+        """
+        return {
+            "metadata": {"session_id": self.session_id, "priority": priority, "route": route}
+        }
+
+    @property
+    def chat_history(self) -> list:
+        """The history as it will be sent to the model on the next turn."""
+        return self.memory.messages()
 
-        self.agent = create_tool_calling_agent(self.llm, self.tools, prompt)
-        self.agent_executor = AgentExecutor(
-            agent=self.agent, tools=self.tools, verbose=False
+    def last_narration(self) -> Optional[str]:
+        """The latest scene or turn narration still in the history."""
+        return next(
+            (m.content for m in reversed(self.memory.messages()) if isinstance(m, AIMessage)),
+            None,
         )
 
-    def generate_opening_scene(self):
+    async def aclose(self):
+        """Stops any speculative turns; the session itself lives on in its journal."""
+        self.speculation.cancel()
+
+    def prefetch_mission(self) -> Future:
         """
-        Generates a mission, adds it to the state, and then generates the opening scene.
+        Starts loading the mission in the background so that it is ready by the
+        time the opening scene is requested.
         """
-        character = self.state.character
-        environment = self.state.environment
+        if self._mission_future is None:
+            self._mission_future = self._background.submit(self._load_mission)
+        return self._mission_future
+
+    def _load_mission(self) -> dict:
+        """
+        Takes a pre-generated mission and scene from the pool, falling back to
+        generating a fresh mission when the pool is empty for this pair.
+        """
+        character = self.state.character.model_copy(deep=True)
+        environment = self.state.environment.model_copy(deep=True)
+
+        entry = self.pool.take(character, environment) if self.pool else None
+        if entry is None:
+            # The player is about to wait on this one
+            return self._generate_mission(
+                character, environment, self._config(INTERACTIVE, MECHANICS)
+            )
+
+        # Replace the entry we just used while the player reads the scene
+        self._background.submit(self._refill_pool, character, environment)
+        return entry
+
+    def _refill_pool(self, character: Character, environment: Environment):
+        """Generates one pool entry for the pair; failures are left for the batch job."""
+        global _refill_failure_logged
+        try:
+            entry = self.generate_pool_entry(character, environment)
+            self.pool.add(character, environment, entry)
+        except Exception:
+            # Once per process, so a broken pool does not flood the terminal
+            if not _refill_failure_logged:
+                _refill_failure_logged = True
+                logger.warning(
+                    "Could not refill the scene pool for %s / %s; later failures are not logged",
+                    character.name,
+                    environment.name,
+                    exc_info=True,
+                )
 
-        # 1. Generate the mission
+    def generate_pool_entry(self, character: Character, environment: Environment) -> dict:
+        """Generates a mission and its opening scene without touching the game state."""
+        mission = self._generate_mission(
+            character, environment, self._config(BACKGROUND, MECHANICS)
+        )
+        description = mission.get("description", "Survive.")
+        messages = self._scene_messages(character, environment, description)
+        return {
+            "description": description,
+            "summary": mission.get("summary", "Survive."),
+            "scene": self.llm.invoke(messages, config=self._config(BACKGROUND)).content,
+        }
+
+    def _generate_mission(
+        self, character: Character, environment: Environment, config: dict
+    ) -> dict:
+        """Asks the LLM for a mission that fits the character and environment."""
         mission_prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -116,25 +350,25 @@ class GameAgent:
             ]
         )
         # Add JSON output mode to the LLM for this chain
-        mission_chain = mission_prompt | self.llm.with_structured_output(
-            method="json_mode"
+        mission_chain = (
+            mission_prompt
+            | self.llm.bind(response_format={"type": "json_object"})
+            | JsonOutputParser()
         )
         mission_input = {
             "character_name": character.name,
             "character_class": character.class_name,
             "environment_name": environment.name,
         }
-        mission_response = mission_chain.invoke(mission_input)
-
-        mission_description = mission_response.get("description", "Survive.")
-        mission_summary = mission_response.get("summary", "Survive.")
+        return mission_chain.invoke(mission_input, config=config)
 
-        # Update state and yield event
-        self.state.mission_description = mission_description
-        self.state.mission_summary = mission_summary
-        yield {"type": "mission_set", "data": mission_description}
-
-        # 2. Generate the opening scene
+    def _scene_messages(
+        self, character: Character, environment: Environment, mission: str
+    ) -> list:
+        """Formats the opening scene prompt into messages."""
+        feeling = character.feeling
+        character = character.model_view()
+        environment = environment.model_view()
         scene_prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -168,11 +402,10 @@ class GameAgent:
             ]
         )
 
-        scene_chain = scene_prompt | self.llm
         scene_input = {
             "character_name": character.name,
             "character_class": character.class_name,
-            "character_feeling": character.feeling,
+            "character_feeling": feeling,
             "character_backstory": character.backstory,
             "character_strengths": ", ".join(character.strengths),
             "character_weaknesses": ", ".join(character.weaknesses),
@@ -182,121 +415,376 @@ class GameAgent:
             "environment_description": environment.description,
             "environment_challenge": environment.challenge,
             "environment_reward": environment.reward,
-            "mission": mission_description,
+            "mission": mission,
         }
+        return scene_prompt.invoke(scene_input).to_messages()
+
+    def generate_opening_scene(self):
+        """
+        Generates a mission, adds it to the state, and then streams the opening scene.
+        Pooled entries skip the LLM entirely.
+        """
+        # 1. Collect the mission, which may already be loaded in the background
+        try:
+            mission_response = self.prefetch_mission().result()
+        except Exception as e:
+            yield self._mission_error(e)
+            return
+        yield self._apply_mission(mission_response)
+
+        # 2. Generate the opening scene, or replay the pooled one. The same
+        # messages feed the LLM and the history either way.
+        messages = self._scene_messages(
+            self.state.character, self.state.environment, self.state.mission_description
+        )
+
+        full_response = mission_response.get("scene", "")
+        try:
+            if not full_response:
+                for chunk in self.llm.stream(messages, config=self._config(INTERACTIVE)):
+                    if chunk.content:
+                        full_response += chunk.content
+                        yield TextDelta(chunk.content)
 
-        full_response = ""
+            yield Text(full_response)
+            self._remember_scene(messages, full_response)
+
+        except Exception as e:
+            yield Error(f"Error generating scene: {e}")
+
+    async def agenerate_opening_scene(self):
+        """Async version of `generate_opening_scene`."""
         try:
-            # Invoke the chain to get the full response at once
-            response = scene_chain.invoke(scene_input)
-            full_response = response.content
+            mission_response = await asyncio.wrap_future(self.prefetch_mission())
+        except Exception as e:
+            yield self._mission_error(e)
+            return
+        yield self._apply_mission(mission_response)
 
-            # Yield a single event for the full text
-            yield {"type": "text", "content": full_response}
+        messages = self._scene_messages(
+            self.state.character, self.state.environment, self.state.mission_description
+        )
+
+        full_response = mission_response.get("scene", "")
+        try:
+            if not full_response:
+                async for chunk in self.llm.astream(
+                    messages, config=self._config(INTERACTIVE)
+                ):
+                    if chunk.content:
+                        full_response += chunk.content
+                        yield TextDelta(chunk.content)
 
-            # Add the user prompts and the final AI response to the history
-            formatted_prompt = scene_prompt.invoke(scene_input)
-            messages = formatted_prompt.to_messages()
-            user_prompts = [msg for msg in messages if isinstance(msg, HumanMessage)]
-            self.chat_history.extend(user_prompts)
-            self.chat_history.append(AIMessage(content=full_response))
+            yield Text(full_response)
+            self._remember_scene(messages, full_response)
 
         except Exception as e:
-            yield {"type": "error", "content": f"Error generating scene: {e}"}
+            yield Error(f"Error generating scene: {e}")
+
+    def _mission_error(self, error: Exception) -> Error:
+        """Forgets a failed mission load, so the next attempt starts a new one."""
+        self._mission_future = None
+        return Error(f"Error generating mission: {error}")
+
+    def _apply_mission(self, mission_response: dict) -> MissionSet:
+        """Stores the mission in the state and returns its event."""
+        self.state.mission_description = mission_response.get("description", "Survive.")
+        self.state.mission_summary = mission_response.get("summary", "Survive.")
+        return MissionSet(self.state.mission_description, self.state.mission_summary)
+
+    def _remember_scene(self, messages: list, scene: str):
+        """Adds the scene's user prompts and the scene itself to the history."""
+        user_prompts = [msg for msg in messages if isinstance(msg, HumanMessage)]
+        scene_messages = [*user_prompts, AIMessage(content=scene)]
+        self.memory.add_turn(scene_messages)
+        events = [Text(scene).to_dict()]
+        self.story_index.add_turn(events)
+        self._record("scene", self.state, scene_messages, events=events)
+
+    def _record(self, kind: str, game_state: GameState, messages: list, **data):
+        """Appends a scene or turn to the session journal, if there is one."""
+        if self.journal is None:
+            return
+        state = game_state.model_dump(mode="json")
+        snapshot_due = self.journal.append(
+            kind, state, messages=[message_to_dict(m) for m in messages], **data
+        )
+        if snapshot_due:
+            summary, turns = self.memory.export()
+            self.journal.snapshot(
+                state,
+                {
+                    "summary": summary,
+                    "turns": [[message_to_dict(m) for m in turn] for turn in turns],
+                },
+                self.story_index.export(),
+            )
 
     def process_user_action(self, user_input: str, game_state: GameState):
         """
-        Processes the user's action using the LangChain agent and yields structured events.
+        Processes the user's action using the tool-calling turn graph, or the
+        single-call fast turn engine when enabled, and yields its events (see
+        `llm.events`).
         """
         try:
-            self.chat_history.append(HumanMessage(content=user_input))
+            turn = self._begin_turn(game_state, user_input)
+            if self.fast_turn:
+                events = self.fast_turn.run(
+                    user_input,
+                    turn.history,
+                    self._character_sheet,
+                    turn.prompt_state(),
+                    turn.stats.usage,
+                    self._config(INTERACTIVE),
+                )
+            else:
+                events = self.turn_graph.run(
+                    self._turn_inputs(user_input, turn),
+                    turn.stats.usage,
+                    self._config(INTERACTIVE),
+                )
+
             full_response = ""
-            game_state_json = game_state.model_dump_json(indent=2)
+            for event in events:
+                full_response += turn.observe(event)
+                yield event
 
-            stream_params = {
-                "input": user_input,
-                "chat_history": self.chat_history,
-                "game_state": game_state_json,
-            }
+            yield from self._finish_turn(user_input, full_response, game_state, turn)
 
-            for event in self.agent_executor.stream(stream_params):
-                match event:
-                    case {"log": _}:
-                        yield from self._handle_log_event(event)
-                    case {"actions": _}:
-                        yield from self._handle_actions_event(event)
-                    case {"steps": _}:
-                        yield from self._handle_steps_event(event)
-                    case {"output": output}:
-                        full_response += output
-                        yield {"type": "text", "content": output}
+        except Exception as e:
+            yield Error(f"Error processing action: {e}")
+
+    async def aprocess_user_action(self, user_input: str, game_state: GameState):
+        """
+        Async version of `process_user_action`. Cancelling the consumer abandons
+        the turn without adding it to the history. An input close to a running
+        speculation (see `speculate`) is served from it.
+        """
+        speculation = self.speculation.claim(user_input)
+        try:
+            if speculation is not None:
+                turn = speculation.turn
+                turn.stats = turn.stats.served(speculation.action)
+                events = speculation.replay()
+            else:
+                turn = self._begin_turn(game_state, user_input)
+                events = self._aturn_events(user_input, turn, self._config(INTERACTIVE))
+
+            full_response = ""
+            async for event in events:
+                full_response += turn.observe(event)
+                yield event
 
-            self.chat_history.append(AIMessage(content=full_response))
+            for event in self._finish_turn(user_input, full_response, game_state, turn):
+                yield event
 
         except Exception as e:
-            yield {"type": "error", "content": f"Error processing action: {e}"}
-
-    def _handle_log_event(self, event):
-        """Handles 'log' events from the stream, yielding 'thought' events."""
-        log_data = event.get("log", {})
-        if log_data.get("runnable_name") == "ChatOpenAI":
-            output = log_data.get("output")
-            thought = getattr(output, "content", "")
-            if thought:
-                yield {"type": "thought", "content": thought}
-
-    def _handle_actions_event(self, event):
-        """Handles 'actions' events, yielding events for tool calls."""
-        for action in event.get("actions", []):
-            if action.tool == "roll_dice":
-                yield {"type": "dice_roll", "data": action.tool_input}
-
-    def _handle_steps_event(self, event):
-        """Handles 'steps' events, dispatching to tool-specific handlers."""
-        for step in event.get("steps", []):
-            if step.action.tool == "roll_dice":
-                yield from self._handle_roll_dice_step(step)
-            elif step.action.tool == "update_game_state":
-                yield from self._handle_update_game_state_step(step)
-            elif step.action.tool == "end_game":
-                yield from self._handle_end_game_step(step)
-
-    def _handle_roll_dice_step(self, step):
-        """Handles the result of a 'roll_dice' tool call."""
-        try:
-            observation_data = json.loads(step.observation)
-            yield {
-                "type": "dice_roll_result",
-                "data": {
-                    "reason": observation_data.get("reason"),
-                    "roll": observation_data.get("roll"),
-                    "sides": observation_data.get("sides"),
-                },
-            }
-        except json.JSONDecodeError:
-            yield {
-                "type": "text",
-                "content": f"\n> Dice roll result: {step.observation}\n",
-            }
+            yield Error(f"Error processing action: {e}")
+        finally:
+            if speculation is not None:
+                speculation.cancel()
 
-    def _handle_update_game_state_step(self, step):
-        """Handles the result of an 'update_game_state' tool call."""
-        try:
-            update_data = json.loads(step.observation)
-            yield {"type": "game_state_update", "data": update_data}
-        except json.JSONDecodeError:
-            yield {
-                "type": "error",
-                "content": f"Invalid state update: {step.observation}",
-            }
+    def _aturn_events(self, user_input: str, turn: "_Turn", config: dict):
+        """The turn engine's async events for one input."""
+        if self.fast_turn:
+            return self.fast_turn.arun(
+                user_input,
+                turn.history,
+                self._character_sheet,
+                turn.prompt_state(),
+                turn.stats.usage,
+                config,
+            )
+        return self.turn_graph.arun(self._turn_inputs(user_input, turn), turn.stats.usage, config)
 
-    def _handle_end_game_step(self, step):
-        """Handles the result of an 'end_game' tool call."""
-        try:
-            end_data = json.loads(step.observation)
-            yield {"type": "end_game", "data": end_data}
-        except json.JSONDecodeError:
-            yield {
-                "type": "error",
-                "content": f"Invalid end_game data: {step.observation}",
+    def speculate(self, game_state: GameState, max_actions: int = 3):
+        """
+        Starts running the turns for up to `max_actions` likely next actions in the
+        background, at background priority, while the player types. Call it from
+        the event loop between turns, without changing `game_state` until the
+        next turn.
+        """
+        self.speculation.start(
+            lambda: self._predict_actions(game_state, max_actions),
+            lambda speculation: self._speculative_turn(speculation, game_state),
+            max_actions,
+        )
+
+    async def _predict_actions(self, game_state: GameState, count: int) -> list[str]:
+        """Asks the mechanics model for the actions the player is most likely to type next."""
+        history = self.memory.messages()
+        last_scene = next(
+            (m.content for m in reversed(history) if isinstance(m, AIMessage)), ""
+        )
+        messages = [
+            SystemMessage(
+                content=(
+                    "Predict what the player of a text adventure will type next. Reply with "
+                    f"a JSON object whose 'actions' key lists the {count} most likely next "
+                    "actions, most likely first, each a short command in the player's "
+                    "words, such as 'look around'."
+                )
+            ),
+            HumanMessage(content=f"{game_state.volatile_json()}\n\n{last_scene}"),
+        ]
+        response = await self.llm.bind(response_format={"type": "json_object"}).ainvoke(
+            messages, config=self._config(BACKGROUND, MECHANICS)
+        )
+        actions = JsonOutputParser().parse(response.content).get("actions", [])
+        return [str(action) for action in actions]
+
+    def _speculative_turn(self, speculation: Speculation, game_state: GameState):
+        """Sets up the turn for a predicted action and returns its events."""
+        speculation.turn = self._begin_turn(game_state, speculation.action)
+        return self._aturn_events(
+            speculation.action, speculation.turn, self._config(BACKGROUND)
+        )
+
+    def _begin_turn(self, game_state: GameState, user_input: str) -> "_Turn":
+        """
+        Collects the history, the game state message and the story facts relevant
+        to the input for a turn.
+        """
+        # The sheet is fixed once the mission is known; format it only once
+        if self._character_sheet is None:
+            self._character_sheet = game_state.character_sheet()
+        # The current input goes in separately, so it joins the memory only
+        # once the turn is complete
+        history = self.memory.messages()
+        stats = TurnStats()
+        # Drop attempt counts left over from calls outside a turn
+        self.runtime.call_policy.take(self.session_id)
+
+        start = time.perf_counter()
+        snapshot = game_state.volatile_state()
+        full_text = f"Current State:\n{compact_json(snapshot)}"
+        full_tokens = estimate_tokens([SystemMessage(content=full_text)])
+        # The full state is sent once and kept in the history; later turns only
+        # send what changed since then. It is sent again once it has left the
+        # history, or once the changes have grown to half its size.
+        state_text, full_state = full_text, True
+        if any(message is self._state_anchor for message in history):
+            delta = game_state.state_delta()
+            delta_text = (
+                f"State changes since the last full state:\n{compact_json(delta)}"
+                if delta
+                else "State unchanged since the last full state."
+            )
+            if estimate_tokens([SystemMessage(content=delta_text)]) * 2 < full_tokens:
+                state_text, full_state = delta_text, False
+        state_message = SystemMessage(content=state_text)
+
+        state_tokens = estimate_tokens([state_message])
+        stats.state = {
+            "state_us": round((time.perf_counter() - start) * 1e6, 1),
+            "state_tokens": state_tokens,
+            "state_full_tokens": full_tokens,
+        }
+
+        start = time.perf_counter()
+        # Only turns that have left the history are worth recalling
+        first_verbatim = self.story_index.turns - self.memory.verbatim_turns() + 1
+        recalled = self.story_index.search(user_input, before_turn=first_verbatim)
+        recall_text = (
+            "Earlier story details that may matter now:\n"
+            + "\n".join(f"- {snippet}" for snippet in recalled)
+            if recalled
+            else ""
+        )
+        stats.state.update(
+            {
+                "recall_us": round((time.perf_counter() - start) * 1e6, 1),
+                "recall_snippets": len(recalled),
+                "recall_tokens": estimate_tokens([SystemMessage(content=recall_text)])
+                if recalled
+                else 0,
             }
+        )
+        return _Turn(history, state_message, snapshot, full_state, stats, recall_text)
+
+    def _turn_inputs(self, user_input: str, turn: "_Turn") -> dict:
+        """Builds the prompt variables for the turn graph."""
+        return {
+            "input": user_input,
+            "chat_history": turn.history,
+            "character_sheet": self._character_sheet,
+            "game_state": turn.prompt_state(),
+        }
+
+    def _finish_turn(
+        self, user_input: str, full_response: str, game_state: GameState, turn: "_Turn"
+    ):
+        """
+        Records the completed turn and yields its memory, cache, route, runtime and
+        turn stats.
+        """
+        turn_messages = [HumanMessage(content=user_input), AIMessage(content=full_response)]
+        if turn.full_state:
+            # A full state joins the history; later deltas are relative to it
+            turn_messages.insert(0, turn.state_message)
+            self._state_anchor = turn.state_message
+            game_state.mark_clean(turn.snapshot)
+        self.memory.add_turn(turn_messages)
+        self.story_index.add_turn(turn.events, user_input)
+        self._record("turn", game_state, turn_messages, input=user_input, events=turn.events)
+
+        yield Stats("memory_stats", self.memory.stats())
+        yield Stats("cache_stats", self._cache_stats(turn.stats.usage))
+        yield Stats("route_stats", self.llm.stats())
+        # Shared by every session in the process: scheduler queues and waits, and
+        # attempt totals under the call policy
+        yield Stats(
+            "runtime_stats",
+            {
+                "scheduler": self.runtime.scheduler.metrics(),
+                "calls": self.runtime.call_policy.metrics(),
+            },
+        )
+        turn.stats.calls = self.runtime.call_policy.take(self.session_id)
+        yield turn.stats.event()
+
+    def _cache_stats(self, usage: dict) -> dict:
+        """Summarizes how much of this turn's prompt was served from the provider cache."""
+        prompt_tokens = usage["prompt_tokens"]
+        cached_tokens = usage["cached_tokens"]
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+
+class _Turn:
+    """What a turn needs from its start to its end."""
+
+    def __init__(
+        self,
+        history: list,
+        state_message: SystemMessage,
+        snapshot: dict,
+        full_state: bool,
+        stats: TurnStats,
+        recall_text: str = "",
+    ):
+        self.history = history
+        self.state_message = state_message
+        self.snapshot = snapshot
+        self.full_state = full_state
+        self.stats = stats
+        # Recalled story details, sent with the state but never kept in the history
+        self.recall_text = recall_text
+        # Events kept for the session journal, as dicts
+        self.events: list[dict] = []
+
+    def observe(self, event: Event) -> str:
+        """Feeds one turn event to the stats and the journal; returns any final text."""
+        self.stats.observe(event)
+        if event.type in JOURNALED_EVENTS:
+            self.events.append(event.to_dict())
+        return event.content if isinstance(event, Text) else ""
+
+    def prompt_state(self) -> str:
+        """The state message text as sent to the model this turn."""
+        if not self.recall_text:
+            return self.state_message.content
+        return f"{self.state_message.content}\n\n{self.recall_text}"
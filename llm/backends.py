@@ -0,0 +1,78 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+
+DEFAULT_BACKEND = "openai"
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+def build_chat_model(
+    backend: str = "",
+    model: str = DEFAULT_MODEL,
+    max_connections: int = 100,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+) -> BaseChatModel:
+    """
+    Builds the chat model for a backend name; LLM_BACKEND picks it when none is
+    given. "openai" talks to the OpenAI API with `model`; "fake" replays a
+    scripted game offline whatever the model, with FAKE_LLM_LATENCY and
+    FAKE_LLM_TOKEN_DELAY (seconds) simulating time to first token and time per
+    token. Async calls use `http_async_client` (see `async_http_client`), which
+    belongs to one event loop; the caller closes it.
+    """
+    backend = backend or os.getenv("LLM_BACKEND", DEFAULT_BACKEND)
+    match backend:
+        case "openai":
+            return _build_openai(
+                model, max_connections, http_async_client or async_http_client(max_connections)
+            )
+        case "fake":
+            from llm.fake import ScriptedChatModel, demo_scripts
+
+            return ScriptedChatModel(
+                scripts=demo_scripts(),
+                latency=float(os.getenv("FAKE_LLM_LATENCY", 0.3)),
+                token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", 0.02)),
+            )
+        case _:
+            raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+def _build_openai(
+    model: str, max_connections: int, http_async_client: httpx.AsyncClient
+) -> BaseChatModel:
+    """Builds the chat model on HTTP clients whose connection pools are shared by every call."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model,
+        temperature=0.7,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        stream_usage=True,
+        # Retries are left to the CallPolicy so that they are counted and jittered
+        max_retries=0,
+        http_client=_http_client(max_connections),
+        http_async_client=http_async_client,
+    )
+
+
+def _limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+
+@lru_cache
+def _http_client(max_connections: int) -> httpx.Client:
+    """One blocking client per process, so models on different routes share connections."""
+    return httpx.Client(limits=_limits(max_connections))
+
+
+def async_http_client(max_connections: int = 100) -> httpx.AsyncClient:
+    """
+    A new async client. Its pooled connections belong to the event loop that
+    first uses it, so it must not outlive that loop; an AgentRuntime owns one and
+    closes it in `AgentRuntime.aclose`.
+    """
+    return httpx.AsyncClient(limits=_limits(max_connections))
@@ -0,0 +1,13 @@
+from data import Character, Environment
+from llm.characters import characters
+from llm.environments import environments
+
+# Parsed once per process and shared by every session. Games must copy an entry
+# before mutating it (see Game.select_character).
+CHARACTERS: tuple[Character, ...] = tuple(Character.from_catalog(c) for c in characters)
+ENVIRONMENTS: tuple[Environment, ...] = tuple(Environment(**e) for e in environments)
+
+# Build the model-facing text of every entry now, so games (which copy their
+# entry, view included) never redo it
+for entry in (*CHARACTERS, *ENVIRONMENTS):
+    entry.model_view()
@@ -0,0 +1,355 @@
+import json
+import struct
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, ClassVar, Optional
+
+
+class Event:
+    """
+    Base of the events a game agent yields to its frontend. Each event type is a
+    small slotted class; `to_dict` gives the plain dict form the terminal
+    frontend handles, and `encode_event` the binary form sent between processes.
+    """
+
+    __slots__ = ()
+    type: ClassVar[str]
+    # (field, kind) pairs that make up the wire form, in order (see `_WRITERS`)
+    wire: ClassVar[tuple[tuple[str, str], ...]]
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "data": self.data()}
+
+    def data(self) -> dict:
+        return {name: getattr(self, name) for name, _ in self.wire}
+
+
+@dataclass(slots=True)
+class MissionSet(Event):
+    type: ClassVar[str] = "mission_set"
+    wire: ClassVar = (("description", "str"), ("summary", "str?"))
+    description: str
+    summary: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "data": self.description}
+
+
+@dataclass(slots=True)
+class TextDelta(Event):
+    type: ClassVar[str] = "text_delta"
+    wire: ClassVar = (("content", "str"),)
+    content: str
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "content": self.content}
+
+
+@dataclass(slots=True)
+class Text(Event):
+    """The complete narration of a scene or turn."""
+
+    type: ClassVar[str] = "text"
+    wire: ClassVar = (("content", "str"),)
+    content: str
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "content": self.content}
+
+
+@dataclass(slots=True)
+class Error(Event):
+    type: ClassVar[str] = "error"
+    wire: ClassVar = (("content", "str"),)
+    content: str
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "content": self.content}
+
+
+@dataclass(slots=True)
+class DiceRoll(Event):
+    """A roll the model has asked for, announced before it is made."""
+
+    type: ClassVar[str] = "dice_roll"
+    wire: ClassVar = (("reason", "str?"), ("sides", "int?"))
+    reason: Optional[str] = None
+    sides: Optional[int] = None
+
+
+@dataclass(slots=True)
+class DiceRollResult(Event):
+    type: ClassVar[str] = "dice_roll_result"
+    wire: ClassVar = (("reason", "str?"), ("roll", "int?"), ("sides", "int?"))
+    reason: Optional[str] = None
+    roll: Optional[int] = None
+    sides: Optional[int] = None
+
+
+@dataclass(slots=True)
+class GameStateUpdate(Event):
+    """Changes to the character; fields left as None are unchanged."""
+
+    type: ClassVar[str] = "game_state_update"
+    wire: ClassVar = (
+        ("feeling", "str?"),
+        ("new_item_name", "str?"),
+        ("new_item_description", "str?"),
+        ("embarrassment", "int?"),
+    )
+    feeling: Optional[str] = None
+    new_item_name: Optional[str] = None
+    new_item_description: Optional[str] = None
+    embarrassment: Optional[int] = None
+
+    def data(self) -> dict:
+        # Only the fields that changed, in the shape the update_game_state tool returns
+        data = {}
+        if self.feeling is not None:
+            data["feeling"] = self.feeling
+        if self.new_item_name is not None:
+            data["new_item"] = {
+                "name": self.new_item_name,
+                "description": self.new_item_description,
+            }
+        if self.embarrassment is not None:
+            data["embarrassment"] = self.embarrassment
+        return data
+
+    @classmethod
+    def from_data(cls, data: dict) -> "GameStateUpdate":
+        new_item = data.get("new_item") or {}
+        return cls(
+            feeling=data.get("feeling"),
+            new_item_name=new_item.get("name"),
+            new_item_description=new_item.get("description"),
+            embarrassment=data.get("embarrassment"),
+        )
+
+
+@dataclass(slots=True)
+class EndGame(Event):
+    type: ClassVar[str] = "end_game"
+    wire: ClassVar = (("win", "bool"), ("reason", "str"))
+    win: bool
+    reason: str
+
+
+@dataclass(slots=True)
+class NodeTiming(Event):
+    type: ClassVar[str] = "node_timing"
+    wire: ClassVar = (("node", "str"), ("ms", "float"))
+    node: str
+    ms: float
+
+
+@dataclass(slots=True)
+class Stats(Event):
+    """
+    Memory, cache, route or turn stats. Their fields change as the agent grows,
+    so they travel as JSON rather than as fixed fields.
+    """
+
+    type: ClassVar[str] = "stats"
+    wire: ClassVar = (("kind", "str"), ("values", "json"))
+    kind: str
+    values: dict
+
+    def to_dict(self) -> dict:
+        return {"type": self.kind, "data": self.values}
+
+
+@dataclass(slots=True)
+class StreamEnd(Event):
+    """
+    Ends the reply to request `request` on an agent worker connection (see
+    `llm.workers`), with the worker's memory use and any result of the request.
+    """
+
+    type: ClassVar[str] = "stream_end"
+    wire: ClassVar = (("request", "int"), ("rss_kb", "int"), ("result", "json?"))
+    request: int
+    rss_kb: int
+    result: Optional[dict] = None
+
+
+# Wire codes; append new event types to keep old codes stable
+EVENT_TYPES: tuple[type[Event], ...] = (
+    MissionSet,
+    TextDelta,
+    Text,
+    Error,
+    DiceRoll,
+    DiceRollResult,
+    GameStateUpdate,
+    EndGame,
+    NodeTiming,
+    Stats,
+    StreamEnd,
+)
+_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+
+async def aas_dicts(events: AsyncIterator[Event]) -> AsyncIterator[dict]:
+    """Adapts a stream of events to the plain dicts the terminal frontend handles."""
+    async for event in events:
+        yield event.to_dict()
+
+
+# Binary encoding. A frame is a varint length followed by the event's code (one
+# byte), its sequence number (varint) and its fields in `wire` order: strings
+# and JSON as a varint length plus UTF-8, integers as zigzag varints, floats as
+# 8 bytes and booleans as one. Optional fields carry a leading presence byte.
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_bytes(out: bytearray, value: bytes):
+    _write_varint(out, len(value))
+    out += value
+
+
+def _read_bytes(data: bytes, pos: int) -> tuple[bytes, int]:
+    length, pos = _read_varint(data, pos)
+    return data[pos : pos + length], pos + length
+
+
+def _write_int(out: bytearray, value: int):
+    _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def _read_int(data: bytes, pos: int) -> tuple[int, int]:
+    value, pos = _read_varint(data, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+
+def _read_float(data: bytes, pos: int) -> tuple[float, int]:
+    return struct.unpack_from("<d", data, pos)[0], pos + 8
+
+
+def _read_str(data: bytes, pos: int) -> tuple[str, int]:
+    raw, pos = _read_bytes(data, pos)
+    return raw.decode(), pos
+
+
+def _read_json(data: bytes, pos: int) -> tuple[object, int]:
+    raw, pos = _read_bytes(data, pos)
+    return json.loads(raw), pos
+
+
+_WRITERS = {
+    "str": lambda out, value: _write_bytes(out, value.encode()),
+    "int": _write_int,
+    "float": lambda out, value: out.extend(struct.pack("<d", value)),
+    "bool": lambda out, value: out.append(1 if value else 0),
+    "json": lambda out, value: _write_bytes(
+        out, json.dumps(value, separators=(",", ":")).encode()
+    ),
+}
+
+_READERS = {
+    "str": _read_str,
+    "int": _read_int,
+    "float": _read_float,
+    "bool": lambda data, pos: (data[pos] == 1, pos + 1),
+    "json": _read_json,
+}
+
+
+def encode_event(event: Event, seq: int) -> bytes:
+    """The length-prefixed frame for `event` with sequence number `seq`."""
+    body = bytearray((_CODES[type(event)],))
+    _write_varint(body, seq)
+    for name, kind in event.wire:
+        value = getattr(event, name)
+        if kind.endswith("?"):
+            if value is None:
+                body.append(0)
+                continue
+            body.append(1)
+            kind = kind[:-1]
+        _WRITERS[kind](body, value)
+    frame = bytearray()
+    _write_varint(frame, len(body))
+    frame += body
+    return bytes(frame)
+
+
+def decode_event(body: bytes) -> tuple[int, Event]:
+    """Returns (sequence number, event) for a frame without its length prefix."""
+    event_type = EVENT_TYPES[body[0]]
+    seq, pos = _read_varint(body, 1)
+    values = []
+    for _, kind in event_type.wire:
+        if kind.endswith("?"):
+            pos += 1
+            if body[pos - 1] == 0:
+                values.append(None)
+                continue
+            kind = kind[:-1]
+        value, pos = _READERS[kind](body, pos)
+        values.append(value)
+    return seq, event_type(*values)
+
+
+class FrameReader:
+    """Splits a byte stream (a pipe or socket) back into numbered events."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[tuple[int, Event]]:
+        """Adds received bytes and returns every event now complete."""
+        self._buffer += data
+        events = []
+        while self._buffer:
+            try:
+                length, start = _read_varint(self._buffer, 0)
+            except IndexError:
+                break
+            if len(self._buffer) < start + length:
+                break
+            events.append(decode_event(bytes(self._buffer[start : start + length])))
+            del self._buffer[: start + length]
+        return events
+
+
+class EventStream:
+    """
+    Numbers and encodes a sequence of events, so that the receiver can tell if
+    any went missing, and keeps the latest `keep` frames so that a receiver
+    whose connection dropped can be sent the ones it missed (see `since`).
+    """
+
+    def __init__(self, keep: int = 1024):
+        self.seq = 0
+        self._frames: deque[bytes] = deque(maxlen=keep)
+
+    def encode(self, event: Event) -> bytes:
+        self.seq += 1
+        frame = encode_event(event, self.seq)
+        self._frames.append(frame)
+        return frame
+
+    def since(self, seq: int) -> Optional[list[bytes]]:
+        """The frames after number `seq`, or None if some are no longer kept."""
+        missed = self.seq - seq
+        if not 0 <= missed <= len(self._frames):
+            return None
+        return list(self._frames)[len(self._frames) - missed :]
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from llm.memory import estimate_tokens
+
+# A scripted reply: plain text, or {"content": ..., "tool_calls": [{"name", "args"}]}
+Reply = Union[str, dict]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline chat model that replays scripted replies. Each script is keyed by a
+    marker; a request uses the first script whose marker appears in its first
+    message (the "" script catches everything else) and gets that script's next
+    reply, cycling. Replies stream word by word after a simulated latency.
+    """
+
+    scripts: dict[str, list[Reply]]
+    latency: float = 0.0
+    token_delay: float = 0.0
+
+    _positions: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._reply(messages)
+        time.sleep(self.latency + self.token_delay * len(_words(message.content)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._reply(messages)
+        await asyncio.sleep(self.latency + self.token_delay * len(_words(message.content)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._reply(messages)
+        time.sleep(self.latency)
+        for chunk in self._chunks(message):
+            if chunk.message.content:
+                time.sleep(self.token_delay)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(message):
+            if chunk.message.content:
+                await asyncio.sleep(self.token_delay)
+            yield chunk
+
+    def _reply(self, messages: list[BaseMessage]) -> AIMessage:
+        """Picks the next reply of the matching script, with usage to match."""
+        prompt = str(messages[0].content) if messages else ""
+        marker = next((m for m in self.scripts if m and m in prompt), "")
+        with self._lock:
+            position = self._positions.get(marker, 0)
+            self._positions[marker] = position + 1
+        replies = self.scripts.get(marker) or [""]
+        reply = replies[position % len(replies)]
+        if isinstance(reply, str):
+            reply = {"content": reply}
+
+        content = reply.get("content", "")
+        tool_calls = [
+            {"name": call["name"], "args": call.get("args", {}), "id": f"call_{position}_{i}"}
+            for i, call in enumerate(reply.get("tool_calls", []))
+        ]
+        input_tokens = estimate_tokens(messages)
+        output_tokens = len(content) // 4 + 1
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    @staticmethod
+    def _chunks(message: AIMessage):
+        """Splits a reply into word chunks, then its tool calls, then its usage."""
+        for word in _words(message.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        if message.tool_calls:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        tool_call_chunk(
+                            name=call["name"],
+                            args=json.dumps(call["args"]),
+                            id=call["id"],
+                            index=i,
+                        )
+                        for i, call in enumerate(message.tool_calls)
+                    ],
+                )
+            )
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=message.usage_metadata)
+        )
+
+
+def _words(text: str) -> list[str]:
+    """Splits text into word tokens that join back to the original."""
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + ([words[-1]] if words[-1] else [])
+
+
+def demo_scripts() -> dict[str, list[Reply]]:
+    """
+    A small scripted game covering every call the agent makes: missions, opening
+    scenes, memory summaries, action predictions, fast turns and tool-calling
+    turns.
+    """
+    return {
+        "mission objective": [
+            json.dumps(
+                {
+                    "description": "Return the duke's runaway hat before the royal banquet.",
+                    "summary": "Find the hat",
+                }
+            )
+        ],
+        "opening scene": [
+            "The morning fog rolls over the hills as a breeze carries rumours of a "
+            "hat with ambitions of its own. Somewhere ahead, something snickers."
+        ],
+        "running summary": [
+            "The hero has wandered, tripped and bargained their way closer to the hat, "
+            "which remains at large and increasingly smug."
+        ],
+        "will type next": [
+            json.dumps({"actions": ["Leap over the hedge", "Talk to the goose", "Look around"]})
+        ],
+        "single JSON object": [
+            json.dumps(
+                {
+                    "dice": [{"reason": "Leap over the hedge"}],
+                    "narration": "You leap, the hedge leaps back, and somehow you both win.",
+                    "feeling": "Smug",
+                    "new_item": None,
+                    "embarrassment": 1,
+                    "end_game": None,
+                }
+            ),
+            json.dumps(
+                {
+                    "dice": [],
+                    "narration": "A goose eyes you with professional disdain.",
+                    "feeling": None,
+                    "new_item": {"name": "Feather", "description": "Slightly judgmental."},
+                    "embarrassment": None,
+                    "end_game": None,
+                }
+            ),
+        ],
+        "": [
+            {"tool_calls": [{"name": "roll_dice", "args": {"reason": "Leap over the hedge"}}]},
+            "You leap, the hedge leaps back, and somehow you both win.",
+            {
+                "content": "A goose eyes you with professional disdain.",
+                "tool_calls": [
+                    {"name": "update_game_state", "args": {"feeling": "Smug", "embarrassment": 1}}
+                ],
+            },
+        ],
+    }
@@ -0,0 +1,201 @@
+import random
+import time
+from typing import Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.utils.json import parse_partial_json
+
+from llm.events import (
+    DiceRollResult,
+    EndGame,
+    Event,
+    GameStateUpdate,
+    NodeTiming,
+    Text,
+    TextDelta,
+)
+
+FATE_DICE = 3
+FATE_DICE_SIDES = 20
+
+FAST_TURN_PROMPT = (
+    "You are a whimsical and humorous text-based adventure game master. "
+    "Guide the player through a story, responding to their actions with vivid descriptions, "
+    "engaging challenges, and funny dialogue. Keep the tone lighthearted, satirical, and creative.\n\n"
+    "Reply with a single JSON object with these keys, in this order:\n"
+    '- "dice": a list of {"reason": string} for each uncertain action, at most '
+    f"{FATE_DICE}. The fate dice for the turn are given with the state; the n-th entry "
+    "uses the n-th fate die, and its result must shape the narration.\n"
+    '- "narration": the story text for this turn.\n'
+    '- "feeling": the character\'s new feeling, or null if unchanged.\n'
+    '- "new_item": {"name": string, "description": string} if an item was gained, or null.\n'
+    '- "embarrassment": points to add (failed rolls, bad decisions), or null.\n'
+    '- "end_game": {"win": bool, "reason": string} if the player completed their mission '
+    "(win) or their embarrassment reached 10 (loss), otherwise null."
+)
+
+
+class FastTurnEngine:
+    """
+    Resolves a whole turn with one model call. Dice are rolled locally before the
+    call, the model answers with narration plus state changes as JSON, and the
+    narration is streamed as it is parsed.
+    """
+
+    def __init__(self, llm: BaseChatModel):
+        self.llm = llm.bind(response_format={"type": "json_object"})
+
+    def run(
+        self,
+        user_input: str,
+        history: list[BaseMessage],
+        character_sheet: str,
+        state_text: str,
+        usage: dict,
+        config: Optional[dict] = None,
+    ):
+        """
+        Yields the same event types as the tool-calling agent for one turn and adds
+        the call's token usage to `usage`.
+        """
+        messages, parser = self._prepare(
+            user_input, history, character_sheet, state_text, usage
+        )
+        for chunk in self.llm.stream(messages, config=config):
+            yield from parser.feed(chunk)
+        yield parser.timing_event()
+        yield from parser.finish()
+
+    async def arun(
+        self,
+        user_input: str,
+        history: list[BaseMessage],
+        character_sheet: str,
+        state_text: str,
+        usage: dict,
+        config: Optional[dict] = None,
+    ):
+        """Async version of `run`."""
+        messages, parser = self._prepare(
+            user_input, history, character_sheet, state_text, usage
+        )
+        async for chunk in self.llm.astream(messages, config=config):
+            for event in parser.feed(chunk):
+                yield event
+        yield parser.timing_event()
+        for event in parser.finish():
+            yield event
+
+    def _prepare(
+        self,
+        user_input: str,
+        history: list[BaseMessage],
+        character_sheet: str,
+        state_text: str,
+        usage: dict,
+    ) -> tuple[list[BaseMessage], "_TurnParser"]:
+        """Rolls the fate dice and builds the messages for one turn."""
+        fate_dice = [random.randint(1, FATE_DICE_SIDES) for _ in range(FATE_DICE)]
+        messages = [
+            SystemMessage(content=FAST_TURN_PROMPT),
+            SystemMessage(content=f"Character Sheet:\n{character_sheet}"),
+            *history,
+            SystemMessage(
+                content=f"{state_text}\n"
+                f"Fate dice (d{FATE_DICE_SIDES}): {', '.join(map(str, fate_dice))}"
+            ),
+            HumanMessage(content=user_input),
+        ]
+        return messages, _TurnParser(fate_dice, usage)
+
+
+class _TurnParser:
+    """Turns the streamed JSON reply of a fast turn into game events."""
+
+    def __init__(self, fate_dice: list[int], usage: dict):
+        self.fate_dice = fate_dice
+        self.usage = usage
+        self.raw = ""
+        self.narration = ""
+        self.dice_reported = False
+        self.start = time.perf_counter()
+
+    def feed(self, chunk) -> list[Event]:
+        """Consumes one streamed chunk and returns the events it completes."""
+        if chunk.usage_metadata:
+            details = chunk.usage_metadata.get("input_token_details", {})
+            self.usage["prompt_tokens"] += chunk.usage_metadata.get("input_tokens", 0)
+            self.usage["completion_tokens"] += chunk.usage_metadata.get("output_tokens", 0)
+            self.usage["cached_tokens"] += details.get("cache_read", 0)
+        self.raw += chunk.content
+        partial = self._parse(self.raw)
+        if partial is None:
+            return []
+
+        events = []
+        # The dice list is complete once the model moves on to the narration
+        if not self.dice_reported and "narration" in partial:
+            self.dice_reported = True
+            events.extend(self._dice_events(partial.get("dice")))
+
+        narration = partial.get("narration") or ""
+        if len(narration) > len(self.narration) and narration.startswith(self.narration):
+            events.append(TextDelta(narration[len(self.narration):]))
+            self.narration = narration
+        return events
+
+    def finish(self) -> list[Event]:
+        """Returns the state, end-game and final text events once the reply is complete."""
+        plan = self._parse(self.raw) or {}
+        events = []
+        if not self.dice_reported:
+            events.extend(self._dice_events(plan.get("dice")))
+
+        update = self._state_update(plan)
+        if update is not None:
+            events.append(update)
+
+        end_data = plan.get("end_game")
+        if isinstance(end_data, dict):
+            events.append(EndGame(bool(end_data.get("win")), str(end_data.get("reason", ""))))
+
+        events.append(Text(plan.get("narration") or self.narration))
+        return events
+
+    def timing_event(self) -> NodeTiming:
+        """Returns the timing event for the model call, as the turn graph reports it."""
+        return NodeTiming("model", round((time.perf_counter() - self.start) * 1000, 2))
+
+    @staticmethod
+    def _parse(raw: str) -> Optional[dict]:
+        """Parses the possibly incomplete JSON received so far."""
+        try:
+            parsed = parse_partial_json(raw)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    def _dice_events(self, dice: Optional[list]):
+        for entry, roll in zip(dice or [], self.fate_dice):
+            reason = entry.get("reason") if isinstance(entry, dict) else str(entry)
+            yield DiceRollResult(reason, roll, FATE_DICE_SIDES)
+
+    def _state_update(self, plan: dict) -> Optional[GameStateUpdate]:
+        """Builds the same update that the update_game_state tool makes, if any."""
+        feeling = plan.get("feeling")
+        new_item = plan.get("new_item")
+        if not (isinstance(new_item, dict) and new_item.get("name")):
+            new_item = {}
+        embarrassment = plan.get("embarrassment")
+        try:
+            embarrassment = int(embarrassment) if embarrassment is not None else None
+        except (TypeError, ValueError):
+            embarrassment = None
+        update = GameStateUpdate(
+            feeling=str(feeling) if feeling is not None else None,
+            new_item_name=new_item.get("name"),
+            new_item_description=new_item.get("description"),
+            embarrassment=embarrassment,
+        )
+        return update if update.data() else None
@@ -0,0 +1,265 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Optional, TypedDict
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    ToolMessage,
+    message_chunk_to_message,
+)
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import BaseTool
+from langgraph.config import get_stream_writer
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from llm.events import (
+    DiceRoll,
+    DiceRollResult,
+    EndGame,
+    Error,
+    GameStateUpdate,
+    NodeTiming,
+    Text,
+    TextDelta,
+)
+
+# Tools whose results the model never needs to read back. When a model response
+# already contains narration and only calls these, the turn ends without another
+# model hop.
+NARRATION_FREE_TOOLS = {"update_game_state", "end_game"}
+
+# Put between the narration of successive model hops in one turn
+HOP_SEPARATOR = "\n\n"
+
+
+class TurnState(TypedDict):
+    input: str
+    chat_history: list[BaseMessage]
+    character_sheet: str
+    game_state: str
+    messages: Annotated[list[BaseMessage], add_messages]
+
+
+class TurnGraph:
+    """
+    LangGraph state machine for one player turn. The model node streams tokens,
+    the tools node runs every tool call from a model response concurrently, and
+    both report their timings as NodeTiming events. Tools return their result
+    as JSON for the model and as a dict artifact for the events, so nothing is
+    parsed back.
+    """
+
+    def __init__(self, llm: BaseChatModel, tools: list[BaseTool], prompt: ChatPromptTemplate):
+        self.llm = llm.bind_tools(tools)
+        self.tools = {tool.name: tool for tool in tools}
+        self.prompt = prompt
+        self._tool_pool = ThreadPoolExecutor(
+            max_workers=len(tools), thread_name_prefix="turn-tools"
+        )
+
+        self.graph = self._compile(self._model_node, self._tools_node)
+        self.agraph = self._compile(self._amodel_node, self._atools_node)
+
+    def _compile(self, model_node, tools_node):
+        graph = StateGraph(TurnState)
+        graph.add_node("model", model_node)
+        graph.add_node("tools", tools_node)
+        graph.add_edge(START, "model")
+        graph.add_conditional_edges("model", self._after_model, ["tools", END])
+        graph.add_conditional_edges("tools", self._after_tools, ["model", END])
+        return graph.compile()
+
+    def run(self, inputs: dict, usage: dict, config: Optional[dict] = None):
+        """
+        Runs the graph for one turn, yielding events as nodes produce them and the
+        narration of every model hop as a final Text event. Token usage is added to
+        `usage`, and `config` (e.g. scheduler metadata) applies to every model call.
+        """
+        texts = []
+        for mode, chunk in self.graph.stream(
+            {**inputs, "messages": []}, config, stream_mode=["custom", "updates"]
+        ):
+            if mode == "custom":
+                yield chunk
+            elif "model" in chunk:
+                texts.append(self._record_model_update(chunk, usage))
+
+        yield Text(HOP_SEPARATOR.join(text for text in texts if text))
+
+    async def arun(self, inputs: dict, usage: dict, config: Optional[dict] = None):
+        """Async version of `run`, driven by the async node implementations."""
+        texts = []
+        async for mode, chunk in self.agraph.astream(
+            {**inputs, "messages": []}, config, stream_mode=["custom", "updates"]
+        ):
+            if mode == "custom":
+                yield chunk
+            elif "model" in chunk:
+                texts.append(self._record_model_update(chunk, usage))
+
+        yield Text(HOP_SEPARATOR.join(text for text in texts if text))
+
+    def _record_model_update(self, chunk: dict, usage: dict) -> str:
+        """Adds a model response's token usage to `usage` and returns its text."""
+        message = chunk["model"]["messages"][-1]
+        usage_metadata = message.usage_metadata or {}
+        details = usage_metadata.get("input_token_details", {})
+        usage["prompt_tokens"] += usage_metadata.get("input_tokens", 0)
+        usage["completion_tokens"] += usage_metadata.get("output_tokens", 0)
+        usage["cached_tokens"] += details.get("cache_read", 0)
+        return message.content
+
+    def _model_node(self, state: TurnState) -> dict:
+        """Streams one model response, forwarding tokens as TextDelta events."""
+        writer = get_stream_writer()
+        start = time.perf_counter()
+
+        separator = _hop_separator(state)
+        message = None
+        for chunk in self.llm.stream(self.prompt.invoke(state)):
+            if chunk.content:
+                writer(TextDelta(separator + chunk.content))
+                separator = ""
+            message = chunk if message is None else message + chunk
+
+        writer(_timing_event("model", start))
+        return {"messages": [message_chunk_to_message(message)]}
+
+    async def _amodel_node(self, state: TurnState) -> dict:
+        """Async version of `_model_node`."""
+        writer = get_stream_writer()
+        start = time.perf_counter()
+
+        separator = _hop_separator(state)
+        message = None
+        async for chunk in self.llm.astream(await self.prompt.ainvoke(state)):
+            if chunk.content:
+                writer(TextDelta(separator + chunk.content))
+                separator = ""
+            message = chunk if message is None else message + chunk
+
+        writer(_timing_event("model", start))
+        return {"messages": [message_chunk_to_message(message)]}
+
+    def _tools_node(self, state: TurnState) -> dict:
+        """Runs all tool calls of the last model response concurrently."""
+        writer = get_stream_writer()
+        start = time.perf_counter()
+        tool_calls = state["messages"][-1].tool_calls
+        self._announce_dice(writer, tool_calls)
+
+        results = list(self._tool_pool.map(self._run_tool, tool_calls))
+
+        return self._tool_results(writer, start, tool_calls, results)
+
+    async def _atools_node(self, state: TurnState) -> dict:
+        """Async version of `_tools_node`, gathering the tool calls on the event loop."""
+        writer = get_stream_writer()
+        start = time.perf_counter()
+        tool_calls = state["messages"][-1].tool_calls
+        self._announce_dice(writer, tool_calls)
+
+        results = await asyncio.gather(
+            *(self._arun_tool(tool_call) for tool_call in tool_calls)
+        )
+
+        return self._tool_results(writer, start, tool_calls, results)
+
+    def _announce_dice(self, writer, tool_calls: list[dict]):
+        for tool_call in tool_calls:
+            if tool_call["name"] == "roll_dice":
+                args = tool_call["args"]
+                writer(DiceRoll(args.get("reason"), args.get("sides")))
+
+    def _tool_results(
+        self, writer, start: float, tool_calls: list[dict], results: list
+    ) -> dict:
+        """Emits the events for finished tool calls and returns their messages."""
+        tool_messages = []
+        for tool_call, (tool_message, ms) in zip(tool_calls, results):
+            for event in self._tool_events(tool_message):
+                writer(event)
+            writer(NodeTiming(f"tool:{tool_call['name']}", ms))
+            tool_messages.append(tool_message)
+
+        writer(_timing_event("tools", start))
+        return {"messages": tool_messages}
+
+    def _run_tool(self, tool_call: dict) -> tuple[ToolMessage, float]:
+        """Runs one tool call, returning its message and duration in ms."""
+        start = time.perf_counter()
+        tool = self.tools.get(tool_call["name"])
+        if tool is None:
+            message = _tool_message(tool_call, f"Unknown tool: {tool_call['name']}")
+        else:
+            try:
+                message = tool.invoke(tool_call)
+            except Exception as e:
+                message = _tool_message(tool_call, f"Tool error: {e}")
+        return message, _elapsed_ms(start)
+
+    async def _arun_tool(self, tool_call: dict) -> tuple[ToolMessage, float]:
+        """Async version of `_run_tool`."""
+        start = time.perf_counter()
+        tool = self.tools.get(tool_call["name"])
+        if tool is None:
+            message = _tool_message(tool_call, f"Unknown tool: {tool_call['name']}")
+        else:
+            try:
+                message = await tool.ainvoke(tool_call)
+            except Exception as e:
+                message = _tool_message(tool_call, f"Tool error: {e}")
+        return message, _elapsed_ms(start)
+
+    def _after_model(self, state: TurnState) -> str:
+        return "tools" if state["messages"][-1].tool_calls else END
+
+    def _after_tools(self, state: TurnState) -> str:
+        """Skips the follow-up model hop when the narration is already written."""
+        message = next(
+            m for m in reversed(state["messages"]) if isinstance(m, AIMessage)
+        )
+        narration_free = all(
+            tool_call["name"] in NARRATION_FREE_TOOLS for tool_call in message.tool_calls
+        )
+        return END if narration_free and str(message.content).strip() else "model"
+
+    def _tool_events(self, message: ToolMessage):
+        """Turns a tool result into the events the frontend consumes."""
+        data = message.artifact
+        if not isinstance(data, dict):
+            yield Error(f"Invalid {message.name} result: {message.content}")
+            return
+
+        match message.name:
+            case "roll_dice":
+                yield DiceRollResult(data.get("reason"), data.get("roll"), data.get("sides"))
+            case "update_game_state":
+                yield GameStateUpdate.from_data(data)
+            case "end_game":
+                yield EndGame(data["win"], data["reason"])
+
+
+def _hop_separator(state: TurnState) -> str:
+    """What goes before this hop's streamed narration, given the earlier hops'."""
+    narrated = any(
+        isinstance(message, AIMessage) and message.content for message in state["messages"]
+    )
+    return HOP_SEPARATOR if narrated else ""
+
+
+def _tool_message(tool_call: dict, content: str) -> ToolMessage:
+    """The message for a tool call that did not run; it has no artifact."""
+    return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"])
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _timing_event(node: str, start: float) -> NodeTiming:
+    return NodeTiming(node, _elapsed_ms(start))
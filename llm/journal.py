@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_SESSION_DIR = Path(os.getenv("SESSION_DIR", "sessions"))
+
+# Turn events worth keeping; streamed tokens and stats are left out
+JOURNALED_EVENTS = {"dice_roll_result", "game_state_update", "end_game", "text", "error"}
+
+
+class SessionNotFound(LookupError):
+    """Raised when resuming a session that has no journal."""
+
+
+def state_diff(old: dict, new: dict) -> dict:
+    """The fields of `new` that differ from `old`, nested dicts compared field by field."""
+    diff = {}
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested = state_diff(old[key], value)
+            if nested:
+                diff[key] = nested
+        elif key not in old or old[key] != value:
+            diff[key] = value
+    return diff
+
+
+def apply_diff(state: dict, diff: dict) -> dict:
+    """Returns `state` with a `state_diff` applied."""
+    merged = dict(state)
+    for key, value in diff.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = apply_diff(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class SessionJournal:
+    """
+    Append-only record of one session: a JSON line per scene or turn with its
+    messages, its notable events and the game state fields it changed. Every
+    `snapshot_every` entries the full state and memory are written to a snapshot
+    that also holds the journal's length at the time, so a resume reads the
+    snapshot and only the entries after it. The snapshot can also carry the
+    session's story index, so that it need not be rebuilt from every entry.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        directory: Path = DEFAULT_SESSION_DIR,
+        snapshot_every: int = int(os.getenv("SESSION_SNAPSHOT_EVERY", 10)),
+    ):
+        self.session_id = session_id
+        self.directory = Path(directory) / session_id
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._state: dict = {}
+        self._seq = 0
+        self._since_snapshot = 0
+
+    @classmethod
+    def new(cls, directory: Path = DEFAULT_SESSION_DIR) -> "SessionJournal":
+        return cls(uuid.uuid4().hex[:12], directory)
+
+    @property
+    def journal_path(self) -> Path:
+        return self.directory / "journal.jsonl"
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / "snapshot.json"
+
+    def append(self, kind: str, state: dict, **data) -> bool:
+        """
+        Appends an entry with the state changes since the previous one; returns
+        True when a snapshot is due.
+        """
+        with self._lock:
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "time": time.time(),
+                "kind": kind,
+                "state": state_diff(self._state, state),
+                **data,
+            }
+            self._state = state
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._since_snapshot += 1
+            return self._since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state: dict, memory: dict, index: Optional[dict] = None):
+        """Writes the full state, memory and story index as of the last entry."""
+        with self._lock:
+            snapshot = {
+                "seq": self._seq,
+                "offset": self.journal_path.stat().st_size if self.journal_path.exists() else 0,
+                "state": state,
+                "memory": memory,
+                "index": index,
+            }
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a torn snapshot
+            tmp_path = self.snapshot_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(snapshot))
+            os.replace(tmp_path, self.snapshot_path)
+            self._since_snapshot = 0
+
+    def entries(self):
+        """Yields every entry in the journal, oldest first."""
+        if not self.journal_path.exists():
+            return
+        with self.journal_path.open() as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+
+    def load(self) -> dict:
+        """
+        Rebuilds the session as {"state", "memory": {"summary", "turns"}, "index",
+        "entries"} from the snapshot and the entries after it, and continues the
+        journal from there. "index" is the snapshot's story index, or None if it
+        has none. A torn last line, left by a crash mid-write, is dropped.
+        """
+        if not self.journal_path.exists():
+            raise SessionNotFound(f"No saved session {self.session_id}")
+        snapshot = {"seq": 0, "offset": 0, "state": {}, "memory": {"summary": "", "turns": []}}
+        if self.snapshot_path.exists():
+            snapshot = json.loads(self.snapshot_path.read_text())
+
+        state = snapshot["state"]
+        turns = list(snapshot["memory"]["turns"])
+        entries = []
+        with self.journal_path.open("rb+") as f:
+            f.seek(snapshot["offset"])
+            while line := f.readline():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Cut the torn line so that new entries start on a fresh one
+                    f.truncate(f.tell() - len(line))
+                    break
+                state = apply_diff(state, entry["state"])
+                turns.append(entry["messages"])
+                entries.append(entry)
+
+        with self._lock:
+            self._state = state
+            self._seq = entries[-1]["seq"] if entries else snapshot["seq"]
+            self._since_snapshot = len(entries)
+        return {
+            "state": state,
+            "memory": {"summary": snapshot["memory"]["summary"], "turns": turns},
+            "index": snapshot.get("index"),
+            "entries": entries,
+        }
+
@@ -0,0 +1,149 @@
+import threading
+from concurrent.futures import Executor
+from typing import Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a text adventure. "
+    "Fold the new events into the existing summary, keeping names, places, items, "
+    "promises and unresolved threads. Drop jokes and scenery that no longer matter. "
+    "Reply with the updated summary only, in no more than 150 words."
+)
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    """Cheap token estimate (about four characters per token plus message overhead)."""
+    return sum(4 + len(str(message.content)) // 4 for message in messages)
+
+
+class ConversationMemory:
+    """
+    Chat history with a token budget. The most recent turns are kept verbatim and
+    older turns are folded into a running summary on a background executor.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        executor: Executor,
+        token_budget: int = 1500,
+        keep_turns: int = 6,
+        config: Optional[dict] = None,
+    ):
+        self.llm = llm
+        self.executor = executor
+        self.config = config
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary = ""
+        self.turns: list[list[BaseMessage]] = []
+        self._pending: list[list[BaseMessage]] = []
+        self._summarizing = False
+        self._total_tokens = 0
+        self._summarized_turns = 0
+        self._lock = threading.Lock()
+
+    def add_turn(self, messages: list[BaseMessage]):
+        """Records a finished turn and folds old turns away if over budget."""
+        with self._lock:
+            self.turns.append(messages)
+            self._total_tokens += estimate_tokens(messages)
+            if len(self.turns) > self.keep_turns or self._over_budget():
+                # Fold down to half the window in one go, so the summary (and
+                # with it the cached prompt prefix) changes every few turns
+                # rather than on every turn
+                while len(self.turns) > max(1, self.keep_turns // 2) or (
+                    len(self.turns) > 1 and self._over_budget()
+                ):
+                    self._pending.append(self.turns.pop(0))
+            if self._pending and not self._summarizing:
+                self._summarizing = True
+                self.executor.submit(self._summarize)
+
+    def messages(self) -> list[BaseMessage]:
+        """Returns the history to send: summary, turns awaiting summary, recent turns."""
+        with self._lock:
+            history = []
+            if self.summary:
+                history.append(SystemMessage(content=f"Story so far:\n{self.summary}"))
+            # Turns still being summarized are sent verbatim so nothing is lost
+            history.extend(self._flatten(self._pending))
+            history.extend(self._flatten(self.turns))
+            return history
+
+    def verbatim_turns(self) -> int:
+        """How many of the latest turns are sent word for word."""
+        with self._lock:
+            return len(self._pending) + len(self.turns)
+
+    def export(self) -> tuple[str, list[list[BaseMessage]]]:
+        """The summary and every turn not yet folded into it, for saving."""
+        with self._lock:
+            return self.summary, [list(turn) for turn in self._pending + self.turns]
+
+    def restore(self, summary: str, turns: list[list[BaseMessage]]):
+        """
+        Replaces the history with a saved one. Nothing is sent to the model; turns
+        beyond the window are folded away after the next turn as usual.
+        """
+        with self._lock:
+            self.summary = summary
+            self.turns = list(turns)
+            self._pending = []
+            self._total_tokens = estimate_tokens(self._flatten(self.turns))
+
+    def stats(self) -> dict:
+        """Reports how many tokens the bounded history saves over the full history."""
+        sent_tokens = estimate_tokens(self.messages())
+        with self._lock:
+            return {
+                "sent_tokens": sent_tokens,
+                "full_tokens": self._total_tokens,
+                "saved_tokens": max(0, self._total_tokens - sent_tokens),
+                "summarized_turns": self._summarized_turns,
+            }
+
+    def _over_budget(self) -> bool:
+        return estimate_tokens(self._flatten(self.turns)) > self.token_budget
+
+    def _summarize(self):
+        """Folds pending turns into the summary until none are left."""
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                updated = self._summarize_batch(summary, batch)
+            except Exception:
+                # Keep the turns verbatim and try again after the next turn
+                with self._lock:
+                    self._summarizing = False
+                return
+            with self._lock:
+                self.summary = updated
+                del self._pending[: len(batch)]
+                self._summarized_turns += len(batch)
+
+    def _summarize_batch(self, summary: str, batch: list[list[BaseMessage]]) -> str:
+        transcript = "\n".join(
+            f"{message.type}: {message.content}" for message in self._flatten(batch)
+        )
+        response = self.llm.invoke(
+            [
+                SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(
+                    content=f"Summary so far:\n{summary or '(none)'}\n\nNew events:\n{transcript}"
+                ),
+            ],
+            config=self.config,
+        )
+        return str(response.content).strip()
+
+    @staticmethod
+    def _flatten(turns: list[list[BaseMessage]]) -> list[BaseMessage]:
+        return [message for turn in turns for message in turn]
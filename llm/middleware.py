@@ -0,0 +1,88 @@
+from typing import Any, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import RunnableConfig, ensure_config
+from pydantic import ConfigDict
+
+# Keyword argument that carries the run metadata down a stack of wrappers
+METADATA_KWARG = "call_metadata"
+
+
+class DelegatingChatModel(BaseChatModel):
+    """
+    Base for chat model wrappers (scheduling, caching, ...). Every call is passed
+    to `inner` unchanged; subclasses override the calls they need to intercept.
+    The run metadata (session id, priority) is available to each layer through
+    `_pop_metadata`, whichever path the call took.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def base_model(self) -> BaseChatModel:
+        """The model at the bottom of the wrapper stack."""
+        model = self.inner
+        while isinstance(model, DelegatingChatModel):
+            model = model.inner
+        return model
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind them to this wrapper
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def stream(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        # The streaming path does not hand a run manager to `_stream`, so the
+        # metadata is passed along as a keyword argument instead
+        yield from super().stream(input, config, **self._with_metadata(config, kwargs))
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        async for chunk in super().astream(
+            input, config, **self._with_metadata(config, kwargs)
+        ):
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._pop_metadata(run_manager, kwargs)
+        return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._pop_metadata(run_manager, kwargs)
+        return await self.inner._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._pop_metadata(run_manager, kwargs)
+        yield from self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._pop_metadata(run_manager, kwargs)
+        async for chunk in self.inner._astream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            yield chunk
+
+    @staticmethod
+    def _with_metadata(config: Optional[RunnableConfig], kwargs: dict) -> dict:
+        return {**kwargs, METADATA_KWARG: ensure_config(config).get("metadata", {})}
+
+    def _pop_metadata(self, run_manager, kwargs: dict) -> dict[str, Any]:
+        """
+        Returns the run metadata of a call and removes it from `kwargs`, putting it
+        back only if the inner model is another wrapper that needs it too.
+        """
+        metadata = (
+            kwargs.pop(METADATA_KWARG, None)
+            or getattr(run_manager, "metadata", None)
+            or {}
+        )
+        if isinstance(self.inner, DelegatingChatModel):
+            kwargs[METADATA_KWARG] = metadata
+        return metadata
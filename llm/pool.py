@@ -0,0 +1,117 @@
+import argparse
+import fcntl
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from data import Character, Environment
+
+DEFAULT_POOL_DIR = Path(os.getenv("SCENE_POOL_DIR", "scene_pool"))
+
+
+class ScenePool:
+    """
+    On-disk pool of pre-generated missions and opening scenes, one JSON file per
+    (character, environment) pair. Each pair's file is locked while it is read
+    and rewritten, so threads and agent worker processes can share one pool.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_POOL_DIR, target_size: int = 3):
+        self.directory = Path(directory)
+        self.target_size = target_size
+
+    def take(self, character: Character, environment: Environment) -> Optional[dict]:
+        """Removes and returns the oldest entry for the pair, if there is one."""
+        with self._locked(character, environment):
+            entries = self._read(character, environment)
+            if not entries:
+                return None
+            entry = entries.pop(0)
+            self._write(character, environment, entries)
+            return entry
+
+    def add(self, character: Character, environment: Environment, entry: dict):
+        """Appends a freshly generated entry for the pair."""
+        with self._locked(character, environment):
+            entries = self._read(character, environment)
+            entries.append(entry)
+            self._write(character, environment, entries)
+
+    def missing(self, character: Character, environment: Environment) -> int:
+        """Returns how many entries the pair is short of the target size."""
+        with self._locked(character, environment):
+            return max(0, self.target_size - len(self._read(character, environment)))
+
+    def _path(self, character: Character, environment: Environment) -> Path:
+        key = f"{character.name}-{character.class_name}--{environment.name}"
+        return self.directory / f"{re.sub(r'[^a-z0-9-]+', '_', key.lower())}.json"
+
+    @contextmanager
+    def _locked(self, character: Character, environment: Environment):
+        # A lock file beside the pool file, which itself is replaced on every write
+        path = self._path(character, environment).with_suffix(".lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self, character: Character, environment: Environment) -> list[dict]:
+        path = self._path(character, environment)
+        if not path.exists():
+            return []
+        try:
+            return json.loads(path.read_text()).get("entries", [])
+        except (OSError, json.JSONDecodeError):
+            return []
+
+    def _write(self, character: Character, environment: Environment, entries: list):
+        path = self._path(character, environment)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a torn pool file
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp", delete=False
+        ) as tmp:
+            tmp.write(json.dumps({"entries": entries}, indent=2))
+        os.replace(tmp.name, path)
+
+
+def default_pool() -> Optional[ScenePool]:
+    """
+    The pool games use unless told otherwise: none with the offline backend
+    (LLM_BACKEND=fake), so that its scripted scenes never mix with real ones.
+    """
+    if os.getenv("LLM_BACKEND") == "fake":
+        return None
+    return ScenePool()
+
+
+def fill_pool(pool: ScenePool):
+    """Tops up every (character, environment) pair in the catalog to the target size."""
+    from data import GameState
+    from llm.agent import GameAgent
+    from llm.catalog import CHARACTERS, ENVIRONMENTS
+
+    agent = GameAgent(GameState())
+    for character in CHARACTERS:
+        for environment in ENVIRONMENTS:
+            for _ in range(pool.missing(character, environment)):
+                entry = agent.generate_pool_entry(character, environment)
+                pool.add(character, environment, entry)
+                print(f"{character.name} / {environment.name}: {entry['summary']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pre-generate missions and opening scenes for every character/environment pair."
+    )
+    parser.add_argument("--dir", type=Path, default=DEFAULT_POOL_DIR)
+    parser.add_argument("--per-pair", type=int, default=3)
+    args = parser.parse_args()
+    fill_pool(ScenePool(args.dir, target_size=args.per_pair))
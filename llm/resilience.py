@@ -0,0 +1,379 @@
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+import httpx
+from langchain_core.outputs import ChatResult
+from pydantic import PrivateAttr
+
+from llm.memory import estimate_tokens
+from llm.middleware import DelegatingChatModel
+from llm.scheduler import INTERACTIVE, OUTPUT_TOKEN_ESTIMATE, LLMScheduler
+
+# HTTP statuses worth another attempt: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Time to first chunk samples needed before hedging starts
+HEDGE_MIN_SAMPLES = 20
+
+# Marks the end of an attempt's output in the race queue
+_DONE = object()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed if sent again."""
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # The OpenAI client wraps transport failures in its own types
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class CallPolicy:
+    """
+    Deadlines, retries and hedging for model calls, shared by every model in the
+    process. A call may go `timeout` seconds without output before it is
+    abandoned; a call that fails before producing output is retried up to
+    `retries` times after a jittered exponential backoff. With `hedge` on, an
+    interactive call that has not started answering by the model's recent p95
+    time to first chunk gets a duplicate request, and the first to answer wins.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60.0,
+        retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge: bool = False,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        # Jitter has its own generator so that seeded games replay the same dice
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._totals: Counter = Counter()
+        self._sessions: dict[str, Counter] = {}
+
+    @classmethod
+    def from_env(cls) -> "CallPolicy":
+        return cls(
+            timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+            retries=int(os.getenv("LLM_RETRIES", 2)),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+        )
+
+    def backoff(self, retry: int) -> float:
+        """Seconds to wait before the given retry (0-based), with full jitter."""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+    def record(self, metadata: dict, counts: Counter):
+        """Adds a finished call's attempt counts to the totals and its session."""
+        with self._lock:
+            self._totals.update(counts)
+            if metadata.get("priority", INTERACTIVE) == INTERACTIVE:
+                session = self._sessions.setdefault(
+                    metadata.get("session_id", "anonymous"), Counter()
+                )
+                session.update(counts)
+
+    def take(self, session_id: str) -> dict:
+        """Returns and resets a session's attempt counts for interactive calls."""
+        with self._lock:
+            counts = self._sessions.pop(session_id, Counter())
+        return {
+            "attempts": counts["attempts"],
+            "retries": counts["retries"],
+            "hedges": counts["hedges"],
+            "timeouts": counts["timeouts"],
+        }
+
+    def metrics(self) -> dict:
+        """Attempt counts across every call, for monitoring."""
+        with self._lock:
+            return dict(self._totals)
+
+
+class ResilientChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that applies a CallPolicy to every call. Output already
+    passed on is never retried; an abandoned synchronous attempt keeps its thread
+    until the underlying request returns. With a `scheduler`, every attempt after
+    the first is charged to its rate limits: a retry waits for room, and a hedge
+    is skipped if there is none.
+    """
+
+    policy: CallPolicy
+    scheduler: Optional[LLMScheduler] = None
+    _first_chunk_ms: deque = PrivateAttr(default_factory=lambda: deque(maxlen=200))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        def call():
+            yield self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        results = self._race(call, self._pop_metadata(run_manager, kwargs), messages)
+        try:
+            return next(results)
+        finally:
+            results.close()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        async def call():
+            yield await self.inner._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+
+        results = self._arace(call, self._pop_metadata(run_manager, kwargs), messages)
+        try:
+            return await anext(results)
+        finally:
+            await results.aclose()
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        metadata = self._pop_metadata(run_manager, kwargs)
+        yield from self._race(
+            lambda: self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            metadata,
+            messages,
+        )
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        metadata = self._pop_metadata(run_manager, kwargs)
+        async for chunk in self._arace(
+            lambda: self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            metadata,
+            messages,
+        ):
+            yield chunk
+
+    def _hedge_delay(self, metadata: dict) -> Optional[float]:
+        """Seconds to wait for a first chunk before hedging, or None for no hedge."""
+        if not self.policy.hedge or metadata.get("priority", INTERACTIVE) != INTERACTIVE:
+            return None
+        samples = sorted(self._first_chunk_ms)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95)] / 1000
+
+    def _can_hedge(self, tokens: int) -> bool:
+        """Charges a hedge to the scheduler; False if its limits have no room."""
+        return self.scheduler is None or self.scheduler.try_charge(tokens)
+
+    def _race(self, call, metadata: dict, messages: list):
+        """
+        Runs `call` (a function returning an iterator) under the policy in worker
+        threads and yields the winning attempt's items.
+        """
+        counts = Counter()
+        tokens = estimate_tokens(messages) + OUTPUT_TOKEN_ESTIMATE
+        try:
+            for retry in range(self.policy.retries + 1):
+                if retry:
+                    counts["retries"] += 1
+                    time.sleep(self.policy.backoff(retry - 1))
+                    if self.scheduler is not None:
+                        self.scheduler.charge(tokens)
+                items: queue.Queue = queue.Queue()
+                attempts = [self._start_thread(call, items, counts)]
+                try:
+                    winner, item = self._first_item(
+                        call, items, attempts, self._hedge_delay(metadata), counts, tokens
+                    )
+                except Exception as e:
+                    for attempt in attempts:
+                        attempt.set()
+                    if retry == self.policy.retries or not is_retryable(e):
+                        raise
+                    continue
+                for attempt in attempts:
+                    if attempt is not winner:
+                        attempt.set()
+                try:
+                    while item is not _DONE:
+                        yield item
+                        item = self._next_item(items, winner, counts)
+                finally:
+                    winner.set()
+                return
+        finally:
+            self.policy.record(metadata, counts)
+
+    def _start_thread(self, call, items: queue.Queue, counts: Counter) -> threading.Event:
+        """Starts one attempt; setting the returned event tells it to stop."""
+        stop = threading.Event()
+
+        def pump():
+            try:
+                iterator = call()
+                try:
+                    for item in iterator:
+                        if stop.is_set():
+                            return
+                        items.put((stop, item, None))
+                finally:
+                    iterator.close()
+                items.put((stop, _DONE, None))
+            except Exception as e:
+                items.put((stop, None, e))
+
+        counts["attempts"] += 1
+        # Carry the caller's context (tracing callbacks) into the worker thread
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(pump,), name="llm-attempt", daemon=True
+        ).start()
+        return stop
+
+    def _first_item(
+        self, call, items: queue.Queue, attempts: list, hedge_delay, counts, tokens: int
+    ):
+        """Waits for the first attempt to produce output; returns (attempt, item)."""
+        start = time.monotonic()
+        deadline = start + self.policy.timeout
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+        failed = set()
+        while True:
+            now = time.monotonic()
+            wait = deadline - now
+            if hedge_at is not None:
+                wait = min(wait, hedge_at - now)
+            try:
+                attempt, item, error = items.get(timeout=max(0.0, wait))
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    if self._can_hedge(tokens):
+                        counts["hedges"] += 1
+                        attempts.append(self._start_thread(call, items, counts))
+                    hedge_at = None
+                    continue
+                counts["timeouts"] += 1
+                raise TimeoutError(f"No response from the model within {self.policy.timeout}s")
+            if attempt in failed:
+                continue
+            if error is not None:
+                failed.add(attempt)
+                if len(failed) == len(attempts):
+                    raise error
+                continue
+            self._first_chunk_ms.append((time.monotonic() - start) * 1000)
+            return attempt, item
+
+    def _next_item(self, items: queue.Queue, winner: threading.Event, counts: Counter):
+        """Returns the winning attempt's next item, skipping the losers' leftovers."""
+        while True:
+            try:
+                attempt, item, error = items.get(timeout=self.policy.timeout)
+            except queue.Empty:
+                counts["timeouts"] += 1
+                raise TimeoutError(f"The model stalled for {self.policy.timeout}s")
+            if attempt is not winner:
+                continue
+            if error is not None:
+                raise error
+            return item
+
+    async def _arace(self, call, metadata: dict, messages: list):
+        """Async version of `_race`; attempts are tasks, and losers are cancelled."""
+        counts = Counter()
+        tokens = estimate_tokens(messages) + OUTPUT_TOKEN_ESTIMATE
+        try:
+            for retry in range(self.policy.retries + 1):
+                if retry:
+                    counts["retries"] += 1
+                    await asyncio.sleep(self.policy.backoff(retry - 1))
+                    if self.scheduler is not None:
+                        await self.scheduler.acharge(tokens)
+                iterators = [self._aopen(call, counts)]
+                try:
+                    winner, first = await self._afirst_item(
+                        call, iterators, self._hedge_delay(metadata), counts, tokens
+                    )
+                except Exception as e:
+                    for iterator in iterators:
+                        await iterator.aclose()
+                    if retry == self.policy.retries or not is_retryable(e):
+                        raise
+                    continue
+                for iterator in iterators:
+                    if iterator is not winner:
+                        await iterator.aclose()
+                try:
+                    if first is _DONE:
+                        return
+                    yield first
+                    while True:
+                        try:
+                            item = await asyncio.wait_for(
+                                anext(winner, _DONE), self.policy.timeout
+                            )
+                        except asyncio.TimeoutError:
+                            counts["timeouts"] += 1
+                            raise TimeoutError(
+                                f"The model stalled for {self.policy.timeout}s"
+                            ) from None
+                        if item is _DONE:
+                            return
+                        yield item
+                finally:
+                    await winner.aclose()
+        finally:
+            self.policy.record(metadata, counts)
+
+    def _aopen(self, call, counts: Counter):
+        counts["attempts"] += 1
+        return aiter(call())
+
+    async def _afirst_item(self, call, iterators: list, hedge_delay, counts, tokens: int):
+        """Waits for the first attempt to produce output; returns (iterator, item)."""
+        start = time.monotonic()
+        deadline = start + self.policy.timeout
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+        pending = {asyncio.ensure_future(anext(iterators[0], _DONE)): iterators[0]}
+        error = None
+        try:
+            while True:
+                now = time.monotonic()
+                wait = deadline - now
+                if hedge_at is not None:
+                    wait = min(wait, hedge_at - now)
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, wait), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if hedge_at is not None and time.monotonic() >= hedge_at:
+                        if self._can_hedge(tokens):
+                            counts["hedges"] += 1
+                            iterators.append(self._aopen(call, counts))
+                            pending[asyncio.ensure_future(anext(iterators[-1], _DONE))] = (
+                                iterators[-1]
+                            )
+                        hedge_at = None
+                        continue
+                    counts["timeouts"] += 1
+                    raise TimeoutError(
+                        f"No response from the model within {self.policy.timeout}s"
+                    )
+                for task in done:
+                    iterator = pending.pop(task)
+                    if task.exception() is None:
+                        self._first_chunk_ms.append((time.monotonic() - start) * 1000)
+                        return iterator, task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
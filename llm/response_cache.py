@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from llm.middleware import METADATA_KWARG, DelegatingChatModel
+
+RECORD = "record"
+REPLAY = "replay"
+PASSTHROUGH = "passthrough"
+
+DEFAULT_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "llm_cache"))
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode for a call that was never recorded."""
+
+
+def cache_key(messages: list[BaseMessage], model: BaseChatModel, options: dict) -> str:
+    """
+    Content address of a call: the normalized messages, the model name and
+    temperature, and the call options (bound tools, response format, stop words).
+    Whitespace and tool call ids do not affect the key.
+    """
+    payload = {
+        "model": getattr(model, "model_name", None) or model._llm_type,
+        "temperature": getattr(model, "temperature", None),
+        "options": {k: v for k, v in options.items() if k != METADATA_KWARG},
+        "messages": [_normalize(message) for message in messages],
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _normalize(message: BaseMessage) -> dict:
+    content = message.content
+    if isinstance(content, str):
+        content = " ".join(content.split())
+    normalized = {"type": message.type, "content": content}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        normalized["tool_calls"] = [
+            {"name": call["name"], "args": call["args"]} for call in message.tool_calls
+        ]
+    return normalized
+
+
+class ResponseCache:
+    """
+    On-disk store of model responses, one JSON file per key. The total size is
+    bounded; the least recently used responses are evicted first, and file
+    modification times carry the recency across restarts.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = 256 * 1024**2):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._load_index()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            DEFAULT_CACHE_DIR,
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", 256)) * 1024**2,
+        )
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+            self._sizes.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text())
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self._bytes -= self._sizes.pop(key, 0)
+            return None
+        return messages_from_dict([data])[0]
+
+    def put(self, key: str, message: AIMessage):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        encoded = json.dumps(message_to_dict(message))
+        # Write to a temporary file first so a crash never leaves a torn entry
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(encoded)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(encoded) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(encoded)
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._sizes),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        if not self.directory.exists():
+            return
+        files = sorted(self.directory.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._sizes[path.stem] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._bytes -= size
+            self._path(key).unlink(missing_ok=True)
+
+
+class CachedChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper in front of a ResponseCache. In record mode hits are served
+    from the cache and misses are passed on and stored; in replay mode misses
+    raise CacheMiss, so a replayed session never reaches the API. Cached replies
+    report no token usage, as none was spent.
+    """
+
+    store: ResponseCache
+    mode: str = RECORD
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is None:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            self.store.put(key, result.generations[0].message)
+            return result
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is None:
+            result = await super()._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            self.store.put(key, result.generations[0].message)
+            return result
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is not None:
+            yield _as_chunk(message)
+            return
+        chunks = []
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append(chunk.message)
+            yield chunk
+        # Only complete responses are stored
+        self._put_chunks(key, chunks)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop, kwargs)
+        message = self._lookup(key)
+        if message is not None:
+            yield _as_chunk(message)
+            return
+        chunks = []
+        async for chunk in super()._astream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            chunks.append(chunk.message)
+            yield chunk
+        self._put_chunks(key, chunks)
+
+    def _key(self, messages: list[BaseMessage], stop, kwargs: dict) -> str:
+        return cache_key(messages, self.base_model, {**kwargs, "stop": stop})
+
+    def _lookup(self, key: str) -> Optional[AIMessage]:
+        message = self.store.get(key)
+        if message is None and self.mode == REPLAY:
+            raise CacheMiss(f"No recorded response for {key[:12]}")
+        if message is not None:
+            message.usage_metadata = None
+        return message
+
+    def _put_chunks(self, key: str, chunks: list[AIMessageChunk]):
+        if chunks:
+            message = chunks[0]
+            for chunk in chunks[1:]:
+                message = message + chunk
+            self.store.put(key, message_chunk_to_message(message))
+
+
+def _as_chunk(message: AIMessage) -> ChatGenerationChunk:
+    """Replays a cached response as a single streamed chunk."""
+    return ChatGenerationChunk(
+        message=AIMessageChunk(
+            content=message.content,
+            tool_call_chunks=[
+                tool_call_chunk(
+                    name=call["name"], args=json.dumps(call["args"]), id=call["id"], index=i
+                )
+                for i, call in enumerate(message.tool_calls)
+            ],
+        )
+    )
+
+
+def response_cache_layer(mode: str = "") -> Callable[[BaseChatModel], BaseChatModel]:
+    """
+    Returns a function that puts a response cache in front of each model it is
+    given, for the mode given or set in LLM_CACHE_MODE. All the models share one
+    store; passthrough (the default) leaves them as they are.
+    """
+    mode = mode or os.getenv("LLM_CACHE_MODE", PASSTHROUGH)
+    if mode not in (RECORD, REPLAY, PASSTHROUGH):
+        raise ValueError(f"Unknown LLM cache mode: {mode}")
+    if mode == PASSTHROUGH:
+        return lambda llm: llm
+    store = ResponseCache.from_env()
+    return lambda llm: CachedChatModel(inner=llm, store=store, mode=mode)
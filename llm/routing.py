@@ -0,0 +1,284 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+
+from llm.backends import DEFAULT_MODEL
+from llm.middleware import DelegatingChatModel
+
+# Short structured work (mission JSON, summaries) and narrative output
+MECHANICS = "mechanics"
+STORY = "story"
+
+# USD per million (input, output) tokens, for the per-route cost estimate
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+
+class RouteStats:
+    """Latency, token and cost counters for one model on one route."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.calls = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.first_token_ms: deque[float] = deque(maxlen=200)
+        self.total_ms: deque[float] = deque(maxlen=200)
+
+    def record(self, first_token_ms: Optional[float], total_ms: float, message):
+        self.calls += 1
+        if first_token_ms is not None:
+            self.first_token_ms.append(first_token_ms)
+        self.total_ms.append(total_ms)
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+
+    def cost(self) -> float:
+        input_price, output_price = MODEL_PRICES.get(self.model_name, (0.0, 0.0))
+        return (self.input_tokens * input_price + self.output_tokens * output_price) / 1e6
+
+    def summary(self) -> dict:
+        return {
+            "model": self.model_name,
+            "calls": self.calls,
+            "failures": self.failures,
+            "first_token_ms_p50": _percentile(self.first_token_ms, 0.5),
+            "total_ms_p50": _percentile(self.total_ms, 0.5),
+            "total_ms_p95": _percentile(self.total_ms, 0.95),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost(), 6),
+        }
+
+
+class Route:
+    """
+    A primary model with an optional fallback. The fallback takes a call when the
+    primary fails before producing output, and takes all calls for `cooldown`
+    seconds once the primary's recent median time to first token exceeds
+    `slow_ms`; after that the primary is tried again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        primary: BaseChatModel,
+        fallback: Optional[BaseChatModel] = None,
+        slow_ms: Optional[float] = None,
+        cooldown: float = 30.0,
+    ):
+        self.name = name
+        self.primary = primary
+        self.fallback = fallback
+        self.slow_ms = slow_ms
+        self.cooldown = cooldown
+        self.stats = {id(primary): RouteStats(_model_name(primary))}
+        if fallback is not None:
+            self.stats[id(fallback)] = RouteStats(_model_name(fallback))
+        self.fallbacks = 0
+        self._recent_first_token: deque[float] = deque(maxlen=10)
+        self._slow_until = 0.0
+        self._lock = threading.Lock()
+
+    def models(self) -> list[BaseChatModel]:
+        """The models to try for a call, in order."""
+        if self.fallback is None:
+            return [self.primary]
+        with self._lock:
+            if time.monotonic() < self._slow_until:
+                return [self.fallback, self.primary]
+        return [self.primary, self.fallback]
+
+    def record(
+        self, model: BaseChatModel, first_token_ms: Optional[float], total_ms: float, message
+    ):
+        with self._lock:
+            self.stats[id(model)].record(first_token_ms, total_ms, message)
+            if model is not self.primary or first_token_ms is None:
+                return
+            self._recent_first_token.append(first_token_ms)
+            if (
+                self.fallback is not None
+                and self.slow_ms is not None
+                and len(self._recent_first_token) >= 3
+                and _percentile(self._recent_first_token, 0.5) > self.slow_ms
+            ):
+                self._slow_until = time.monotonic() + self.cooldown
+                self._recent_first_token.clear()
+
+    def record_failure(self, model: BaseChatModel, will_fall_back: bool):
+        with self._lock:
+            self.stats[id(model)].failures += 1
+            if will_fall_back:
+                self.fallbacks += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "fallbacks": self.fallbacks,
+                "models": [stats.summary() for stats in self.stats.values()],
+            }
+
+
+class ModelRouter(DelegatingChatModel):
+    """
+    Chat model that sends each call to the route named by the run metadata
+    ("route"), falling back to `default_route`. `inner` is the default route's
+    primary model, which formats tools for every route.
+    """
+
+    routes: dict[str, Route]
+    default_route: str = STORY
+
+    @classmethod
+    def from_routes(cls, routes: dict[str, Route], default_route: str = STORY) -> "ModelRouter":
+        return cls(
+            inner=routes[default_route].primary, routes=routes, default_route=default_route
+        )
+
+    def stats(self) -> dict:
+        """Per-route latency, token and cost figures."""
+        return {name: route.summary() for name, route in self.routes.items()}
+
+    def _route(self, run_manager, kwargs: dict) -> Route:
+        metadata = self._pop_metadata(run_manager, kwargs)
+        return self.routes.get(metadata.get("route"), self.routes[self.default_route])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        route = self._route(run_manager, kwargs)
+        models = route.models()
+        for attempt, model in enumerate(models):
+            start = time.perf_counter()
+            try:
+                result = model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception:
+                route.record_failure(model, attempt + 1 < len(models))
+                if attempt + 1 == len(models):
+                    raise
+                continue
+            # A reply that is not streamed arrives all at once
+            elapsed_ms = _elapsed_ms(start)
+            route.record(model, elapsed_ms, elapsed_ms, result.generations[0].message)
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        route = self._route(run_manager, kwargs)
+        models = route.models()
+        for attempt, model in enumerate(models):
+            start = time.perf_counter()
+            try:
+                result = await model._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except Exception:
+                route.record_failure(model, attempt + 1 < len(models))
+                if attempt + 1 == len(models):
+                    raise
+                continue
+            # A reply that is not streamed arrives all at once
+            elapsed_ms = _elapsed_ms(start)
+            route.record(model, elapsed_ms, elapsed_ms, result.generations[0].message)
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        route = self._route(run_manager, kwargs)
+        models = route.models()
+        for attempt, model in enumerate(models):
+            start = time.perf_counter()
+            first_token_ms, message = None, None
+            try:
+                for chunk in model._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    if first_token_ms is None:
+                        first_token_ms = _elapsed_ms(start)
+                    message = chunk.message if message is None else message + chunk.message
+                    yield chunk
+            except Exception:
+                # Output already shown to the player cannot be taken back
+                if message is not None or attempt + 1 == len(models):
+                    route.record_failure(model, False)
+                    raise
+                route.record_failure(model, True)
+                continue
+            route.record(model, first_token_ms, _elapsed_ms(start), message)
+            return
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        route = self._route(run_manager, kwargs)
+        models = route.models()
+        for attempt, model in enumerate(models):
+            start = time.perf_counter()
+            first_token_ms, message = None, None
+            try:
+                async for chunk in model._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    if first_token_ms is None:
+                        first_token_ms = _elapsed_ms(start)
+                    message = chunk.message if message is None else message + chunk.message
+                    yield chunk
+            except Exception:
+                if message is not None or attempt + 1 == len(models):
+                    route.record_failure(model, False)
+                    raise
+                route.record_failure(model, True)
+                continue
+            route.record(model, first_token_ms, _elapsed_ms(start), message)
+            return
+
+
+def build_routes(
+    make_model: Callable[[str], BaseChatModel], default_model: str = DEFAULT_MODEL
+) -> dict[str, Route]:
+    """
+    Builds the routes from the environment: LLM_STORY_MODEL and
+    LLM_MECHANICS_MODEL name each route's model, LLM_FALLBACK_MODEL the model
+    both fall back to, and LLM_SLOW_MS the median time to first token above
+    which a route switches to its fallback. `make_model` is called once per
+    distinct model name.
+    """
+    models: dict[str, BaseChatModel] = {}
+
+    def model(name: str) -> BaseChatModel:
+        if name not in models:
+            models[name] = make_model(name)
+        return models[name]
+
+    fallback_name = os.getenv("LLM_FALLBACK_MODEL")
+    fallback = model(fallback_name) if fallback_name else None
+    slow_ms = float(os.getenv("LLM_SLOW_MS")) if os.getenv("LLM_SLOW_MS") else None
+    routes = {}
+    for name, variable in ((STORY, "LLM_STORY_MODEL"), (MECHANICS, "LLM_MECHANICS_MODEL")):
+        primary = model(os.getenv(variable, default_model))
+        routes[name] = Route(
+            name, primary, fallback if fallback is not primary else None, slow_ms
+        )
+    return routes
+
+
+def _model_name(model: BaseChatModel) -> str:
+    if isinstance(model, DelegatingChatModel):
+        model = model.base_model
+    return getattr(model, "model_name", None) or model._llm_type
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 2)
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
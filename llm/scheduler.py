@@ -0,0 +1,344 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from llm.memory import estimate_tokens
+from llm.middleware import DelegatingChatModel
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Lower rank is served first
+PRIORITY_RANK = {INTERACTIVE: 0, BACKGROUND: 1}
+
+# Completion tokens reserved per request until the real usage is known
+OUTPUT_TOKEN_ESTIMATE = 400
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when background work is refused because the queue is full."""
+
+
+class TokenBucket:
+    """Refills continuously up to `per_minute`; callers take what they need."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _Ticket:
+    """A queued or running request."""
+
+    def __init__(self, session_id: str, priority: str, tokens: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.used_tokens: Optional[int] = None
+        self.enqueued = time.monotonic()
+        self.granted = threading.Event()
+        self.on_grant = None
+
+    def grant(self):
+        self.granted.set()
+        if self.on_grant:
+            self.on_grant()
+
+
+class LLMScheduler:
+    """
+    Gatekeeper for every model request in the process. Requests wait for a slot
+    under requests-per-minute and tokens-per-minute buckets and a concurrency cap.
+    Interactive requests go before background ones, sessions at the same priority
+    take turns, and background requests are refused once the queue is full. The
+    retries and hedges of a request that holds a slot are charged to the same
+    buckets (see `charge`).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 200_000,
+        max_concurrency: int = 32,
+        max_queue: int = 256,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        # priority -> session id -> waiting tickets; sessions rotate for fairness
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_RANK}
+        self._queued = 0
+        self._granted = 0
+        self._charged = 0
+        self._rejected = 0
+        self._wait_ms: deque[float] = deque(maxlen=500)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="llm-scheduler", daemon=True
+        )
+        self._dispatcher.start()
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", 500)),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", 200_000)),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 32)),
+        )
+
+    @contextmanager
+    def slot(self, session_id: str, priority: str, tokens: int):
+        """Blocks until the request may run, and releases its slot afterwards."""
+        ticket = self._enqueue(session_id, priority, tokens)
+        try:
+            ticket.granted.wait()
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, session_id: str, priority: str, tokens: int):
+        """Async version of `slot`; cancelling while queued gives up the place."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        ticket = _Ticket(session_id, priority, tokens)
+        ticket.on_grant = lambda: loop.call_soon_threadsafe(
+            lambda: granted.done() or granted.set_result(None)
+        )
+        self._enqueue(session_id, priority, tokens, ticket)
+        try:
+            await granted
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def charge(self, tokens: int):
+        """
+        Blocks until the rate limits allow one more request of `tokens`, and
+        counts it against them. For extra attempts (retries) of a call that
+        already holds a slot, which use no more of the concurrency cap.
+        """
+        with self._cond:
+            while (delay := self._bucket_delay(tokens)) > 0:
+                self._cond.wait(delay)
+            self._charge(tokens)
+
+    async def acharge(self, tokens: int):
+        """Async version of `charge`."""
+        while True:
+            with self._cond:
+                delay = self._bucket_delay(tokens)
+                if delay <= 0:
+                    self._charge(tokens)
+                    return
+            await asyncio.sleep(delay)
+
+    def try_charge(self, tokens: int) -> bool:
+        """Like `charge`, but returns False at once if the limits have no room."""
+        with self._cond:
+            if self._bucket_delay(tokens) > 0:
+                return False
+            self._charge(tokens)
+            return True
+
+    def close(self):
+        """Stops granting slots; call it once the scheduler's requests have ended."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+
+    def metrics(self) -> dict:
+        """Queue depths and grant statistics for monitoring."""
+        with self._cond:
+            waits = sorted(self._wait_ms)
+            return {
+                "queued": {
+                    priority: sum(len(q) for q in sessions.values())
+                    for priority, sessions in self._queues.items()
+                },
+                "queued_sessions": len(
+                    {s for sessions in self._queues.values() for s in sessions}
+                ),
+                "in_flight": self.in_flight,
+                "granted": self._granted,
+                "charged": self._charged,
+                "rejected": self._rejected,
+                "wait_ms_p50": waits[len(waits) // 2] if waits else 0.0,
+                "wait_ms_max": waits[-1] if waits else 0.0,
+            }
+
+    def _enqueue(
+        self, session_id: str, priority: str, tokens: int, ticket: Optional[_Ticket] = None
+    ) -> _Ticket:
+        ticket = ticket or _Ticket(session_id, priority, tokens)
+        with self._cond:
+            if priority != INTERACTIVE and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise SchedulerBusy(f"LLM queue is full ({self._queued} waiting)")
+            self._queues[priority].setdefault(session_id, deque()).append(ticket)
+            self._queued += 1
+            self._cond.notify()
+        return ticket
+
+    def _abandon(self, ticket: _Ticket):
+        """Drops a ticket whose caller stopped waiting."""
+        with self._cond:
+            sessions = self._queues[ticket.priority]
+            waiting = sessions.get(ticket.session_id)
+            if waiting and ticket in waiting:
+                waiting.remove(ticket)
+                self._queued -= 1
+                if not waiting:
+                    del sessions[ticket.session_id]
+                return
+        # Granted just before the caller gave up
+        if ticket.granted.is_set():
+            self._release(ticket)
+
+    def _release(self, ticket: _Ticket):
+        with self._cond:
+            self.in_flight -= 1
+            # Settle the token estimate against the real usage when it is known
+            if ticket.used_tokens is not None:
+                difference = ticket.tokens - ticket.used_tokens
+                if difference > 0:
+                    self.tokens.give_back(difference)
+                else:
+                    self.tokens.take(-difference)
+            self._cond.notify()
+
+    def _bucket_delay(self, tokens: int) -> float:
+        """Seconds until the buckets allow a request of `tokens` (0 if they do now)."""
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _charge(self, tokens: int):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._charged += 1
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        for priority in sorted(self._queues, key=PRIORITY_RANK.get):
+            sessions = self._queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _dispatch(self):
+        """Grants queued tickets whenever limits allow."""
+        with self._cond:
+            while not self._closed:
+                ticket = self._next_ticket()
+                if ticket is None or self.in_flight >= self.max_concurrency:
+                    self._cond.wait()
+                    continue
+
+                delay = self._bucket_delay(ticket.tokens)
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                sessions = self._queues[ticket.priority]
+                waiting = sessions.pop(ticket.session_id)
+                waiting.popleft()
+                if waiting:
+                    # Back of the line, so other sessions get the next grant
+                    sessions[ticket.session_id] = waiting
+                self._queued -= 1
+                self.requests.take(1)
+                self.tokens.take(ticket.tokens)
+                self.in_flight += 1
+                self._granted += 1
+                self._wait_ms.append((time.monotonic() - ticket.enqueued) * 1000)
+                ticket.grant()
+
+
+class ScheduledChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that routes every call through an LLMScheduler. The session
+    id and priority come from the run metadata ("session_id", "priority"), so they
+    follow a call through chains and graphs.
+    """
+
+    scheduler: LLMScheduler
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        with self.scheduler.slot(*self._request(messages, run_manager, kwargs)) as ticket:
+            result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            ticket.used_tokens = _total_tokens(result.generations[0].message)
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        async with self.scheduler.aslot(*self._request(messages, run_manager, kwargs)) as ticket:
+            result = await self.inner._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            ticket.used_tokens = _total_tokens(result.generations[0].message)
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self.scheduler.slot(*self._request(messages, run_manager, kwargs)) as ticket:
+            for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                ticket.used_tokens = _total_tokens(chunk.message) or ticket.used_tokens
+                yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async with self.scheduler.aslot(*self._request(messages, run_manager, kwargs)) as ticket:
+            async for chunk in self.inner._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                ticket.used_tokens = _total_tokens(chunk.message) or ticket.used_tokens
+                yield chunk
+
+    def _request(
+        self, messages: list[BaseMessage], run_manager, kwargs: dict
+    ) -> tuple[str, str, int]:
+        """Returns the (session id, priority, token estimate) of a call."""
+        metadata = self._pop_metadata(run_manager, kwargs)
+        return (
+            metadata.get("session_id", "anonymous"),
+            metadata.get("priority", INTERACTIVE),
+            estimate_tokens(messages) + OUTPUT_TOKEN_ESTIMATE,
+        )
+
+
+def _total_tokens(message) -> Optional[int]:
+    usage_metadata = getattr(message, "usage_metadata", None)
+    return usage_metadata.get("total_tokens") if usage_metadata else None
@@ -0,0 +1,150 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from llm.events import Event
+
+# Actions worth running ahead whatever the model predicts; they start first
+COMMON_ACTIONS = ("look around",)
+
+# Words that do not change what an action asks for
+FILLER_WORDS = {"a", "an", "and", "at", "i", "it", "me", "my", "please", "the", "then", "to"}
+
+
+def normalize_action(text: str) -> tuple[str, ...]:
+    """The meaningful words of an action, lower-cased and without punctuation."""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return tuple(word for word in words if word not in FILLER_WORDS) or tuple(words)
+
+
+def actions_match(a: str, b: str) -> bool:
+    """
+    Whether two actions ask for the same thing: the same meaningful words, in
+    any order. A turn served for the wrong action commits the wrong story and
+    state, so near misses such as "go east" and "go west" do not match.
+    """
+    words = set(normalize_action(a))
+    return bool(words) and words == set(normalize_action(b))
+
+
+class Speculation:
+    """
+    A predicted action whose turn runs ahead of time. Its events are buffered
+    until it is claimed, then replayed and followed live. `turn` is the caller's
+    context for the turn, set when it starts.
+    """
+
+    def __init__(self, action: str):
+        self.action = action
+        self.turn = None
+        self.events: list[Event] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    async def run(self, events: AsyncIterator[Event]):
+        try:
+            async for event in events:
+                self.events.append(event)
+                self._changed.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._changed.set()
+
+    async def replay(self) -> AsyncIterator[Event]:
+        """Yields the buffered events, then the rest as they arrive."""
+        served = 0
+        while True:
+            while served < len(self.events):
+                yield self.events[served]
+                served += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class SpeculativeTurns:
+    """
+    Runs the turns for a few likely next actions while the player types. The
+    input is matched against them once it arrives (see `actions_match`): a
+    matching action is served from its speculative turn, and every other one is
+    cancelled.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.served = 0
+        self._speculations: list[Speculation] = []
+        self._predicting: Optional[asyncio.Task] = None
+
+    def start(
+        self,
+        predict: Callable[[], Awaitable[list[str]]],
+        begin: Callable[[Speculation], AsyncIterator[Event]],
+        max_actions: int,
+    ):
+        """
+        Cancels any running speculation, then starts up to `max_actions` distinct
+        actions: the common ones at once, then those predicted by `predict`.
+        `begin` sets up an action's turn and returns its events.
+        """
+        self.cancel()
+        self._predicting = asyncio.create_task(self._start(predict, begin, max_actions))
+
+    async def _start(self, predict, begin, max_actions: int):
+        self._begin_all(COMMON_ACTIONS, begin, max_actions)
+        try:
+            actions = await predict()
+        except Exception:
+            return
+        self._begin_all(actions, begin, max_actions)
+
+    def _begin_all(self, actions, begin, max_actions: int):
+        for action in actions:
+            if len(self._speculations) >= max_actions:
+                break
+            if any(actions_match(action, s.action) for s in self._speculations):
+                continue
+            speculation = Speculation(action)
+            events = begin(speculation)
+            speculation.task = asyncio.create_task(speculation.run(events))
+            self._speculations.append(speculation)
+            self.started += 1
+
+    def claim(self, user_input: str) -> Optional[Speculation]:
+        """
+        Returns the running speculation whose action matches `user_input`, if it
+        has not failed, and cancels all the others.
+        """
+        match = next(
+            (
+                speculation
+                for speculation in self._speculations
+                if speculation.error is None and actions_match(user_input, speculation.action)
+            ),
+            None,
+        )
+        if match is not None:
+            self._speculations.remove(match)
+            self.served += 1
+        self.cancel()
+        return match
+
+    def cancel(self):
+        """Stops every speculation that has not been claimed."""
+        if self._predicting is not None:
+            self._predicting.cancel()
+            self._predicting = None
+        for speculation in self._speculations:
+            speculation.cancel()
+        self._speculations = []
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from llm.events import Event, NodeTiming, Stats, TextDelta
+
+
+class TurnStats:
+    """
+    Spans and counters for one turn. The agent feeds it every event it yields, and
+    the turn engines add their token usage to `usage`.
+    """
+
+    def __init__(self):
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        # Cost of the game state message, filled in by the agent
+        self.state: dict = {}
+        # Attempts, retries, hedges and timeouts of its model calls, filled in by the agent
+        self.calls: dict = {}
+        # The predicted action whose speculative turn was served, if any
+        self.speculated: Optional[str] = None
+        self._start = time.perf_counter()
+        self._first_token_ms: Optional[float] = None
+        self._model_ms: list[float] = []
+        self._tool_ms: list[dict] = []
+
+    def observe(self, event: Event):
+        """Records the timing information carried by one turn event."""
+        match event:
+            case TextDelta():
+                if self._first_token_ms is None:
+                    self._first_token_ms = self._elapsed_ms()
+            case NodeTiming(node="model", ms=ms):
+                self._model_ms.append(ms)
+            case NodeTiming(node=node, ms=ms) if node.startswith("tool:"):
+                self._tool_ms.append({"tool": node[len("tool:"):], "ms": ms})
+
+    def served(self, action: str) -> "TurnStats":
+        """
+        Stats for a speculative turn handed to the player: timing restarts now,
+        while the usage (still being filled in) and the state cost carry over.
+        """
+        stats = TurnStats()
+        stats.usage = self.usage
+        stats.state = self.state
+        stats.speculated = action
+        return stats
+
+    def event(self) -> Stats:
+        """Returns the 'turn_stats' event for the finished turn."""
+        return Stats(
+            "turn_stats",
+            {
+                "total_ms": self._elapsed_ms(),
+                "first_token_ms": self._first_token_ms,
+                "hops": len(self._model_ms),
+                "model_ms": self._model_ms,
+                "tool_ms": self._tool_ms,
+                **self.usage,
+                **self.state,
+                **self.calls,
+                "speculated": self.speculated,
+            },
+        )
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+
+class StatsLog:
+    """Appends turn stats to a JSONL file, one line per turn."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def write(self, session_id: str, data: dict):
+        line = json.dumps({"time": time.time(), "session_id": session_id, **data})
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(line + "\n")
@@ -0,0 +1,158 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+# Words too common in adventure prose to tell snippets apart
+STOP_WORDS = {
+    "a", "about", "after", "again", "all", "an", "and", "are", "as", "at", "be", "but",
+    "by", "can", "do", "for", "from", "had", "has", "have", "he", "her", "his", "i",
+    "if", "in", "into", "is", "it", "its", "just", "me", "my", "no", "not", "of", "on",
+    "or", "out", "she", "so", "that", "the", "their", "then", "there", "they", "this",
+    "to", "up", "was", "with", "you", "your",
+}
+
+# Longest snippet kept, in characters, so that one long sentence cannot crowd out the rest
+MAX_SNIPPET_CHARS = 240
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words without stop words, with plural and possessive endings cut."""
+    terms = []
+    for word in re.findall(r"[a-z0-9']+", text.lower()):
+        word = word.removesuffix("'s").strip("'")
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if word and word not in STOP_WORDS:
+            terms.append(word)
+    return terms
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+
+
+class StoryIndex:
+    """
+    In-process BM25 index over the story so far, one per session. Each scene or
+    turn adds its narration sentences and the facts in its events (items found,
+    dice rolls, feelings), so details that the running summary has dropped can
+    still be found again by the words of the player's next action.
+    """
+
+    def __init__(
+        self,
+        top_k: int = int(os.getenv("STORY_RECALL_K", 3)),
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self.turns = 0
+        # term -> [(snippet id, term count)], appended to as turns are added
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._snippets: list[str] = []
+        self._snippet_turns: list[int] = []
+        self._lengths: list[int] = []
+        self._total_length = 0
+        self._seen: set[str] = set()
+
+    def add_turn(self, events: list[dict], user_input: Optional[str] = None):
+        """Indexes one scene or turn from its journaled events."""
+        self.turns += 1
+        for event in events:
+            match event.get("type"):
+                case "text":
+                    for sentence in split_sentences(event.get("content", "")):
+                        self._add(sentence)
+                case "game_state_update":
+                    self._add_update(event.get("data", {}))
+                case "dice_roll_result":
+                    data = event.get("data", {})
+                    if data.get("reason"):
+                        self._add(f"Rolled {data.get('roll')} for: {data['reason']}")
+        if user_input:
+            self._add(f"Player: {user_input}")
+
+    def _add_update(self, data: dict):
+        item = data.get("new_item")
+        if isinstance(item, dict) and item.get("name"):
+            description = item.get("description")
+            self._add(f"Gained {item['name']}" + (f": {description}" if description else ""))
+        if data.get("feeling"):
+            self._add(f"Felt {data['feeling']}")
+
+    def _add(self, text: str):
+        text = text[:MAX_SNIPPET_CHARS]
+        terms = Counter(tokenize(text))
+        if not terms or text in self._seen:
+            return
+        self._seen.add(text)
+        snippet_id = len(self._snippets)
+        self._snippets.append(text)
+        self._snippet_turns.append(self.turns)
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, count in terms.items():
+            self._postings.setdefault(term, []).append((snippet_id, count))
+
+    def export(self) -> dict:
+        """The indexed snippets and the turns they came from, for saving."""
+        return {
+            "turns": self.turns,
+            "snippets": self._snippets,
+            "snippet_turns": self._snippet_turns,
+            "postings": self._postings,
+        }
+
+    def restore(self, saved: dict):
+        """Replaces the index with a saved one (see `export`)."""
+        self.turns = saved["turns"]
+        self._snippets = list(saved["snippets"])
+        self._snippet_turns = list(saved["snippet_turns"])
+        self._postings = {
+            term: [(snippet_id, count) for snippet_id, count in postings]
+            for term, postings in saved["postings"].items()
+        }
+        self._lengths = [0] * len(self._snippets)
+        for postings in self._postings.values():
+            for snippet_id, count in postings:
+                self._lengths[snippet_id] += count
+        self._total_length = sum(self._lengths)
+        self._seen = set(self._snippets)
+
+    def search(
+        self, query: str, k: Optional[int] = None, before_turn: Optional[int] = None
+    ) -> list[str]:
+        """
+        The `k` snippets that best match `query`, in story order. Snippets from turn
+        `before_turn` onwards are skipped; pass the first turn still in the history
+        so that nothing the model already sees is sent twice.
+        """
+        k = self.top_k if k is None else k
+        if k <= 0 or not self._snippets:
+            return []
+        count = len(self._snippets)
+        average_length = self._total_length / count
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for snippet_id, tf in postings:
+                if before_turn is not None and self._snippet_turns[snippet_id] >= before_turn:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[snippet_id] / average_length)
+                scores[snippet_id] = scores.get(snippet_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norm
+                )
+        best = sorted(scores, key=lambda snippet_id: (-scores[snippet_id], snippet_id))[:k]
+        # Story order reads better than score order
+        return [self._snippets[snippet_id] for snippet_id in sorted(best)]
+
+    def stats(self) -> dict:
+        return {"turns": self.turns, "snippets": len(self._snippets), "terms": len(self._postings)}
@@ -0,0 +1,685 @@
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import uuid
+from contextlib import aclosing
+from pathlib import Path
+from typing import Optional
+
+from data import GameState
+from llm.events import (
+    EndGame,
+    Error,
+    Event,
+    EventStream,
+    FrameReader,
+    GameStateUpdate,
+    MissionSet,
+    StreamEnd,
+)
+from llm.journal import DEFAULT_SESSION_DIR, SessionNotFound
+from llm.pool import ScenePool
+
+# Memory use at which a worker stops taking sessions and is replaced
+DEFAULT_MAX_RSS_MB = int(os.getenv("AGENT_WORKER_MAX_RSS_MB", 1024))
+
+# How long a worker keeps a session whose connection dropped, for its client to reattach
+RESUME_SECONDS = float(os.getenv("AGENT_WORKER_RESUME_SECONDS", 30))
+
+# Largest request line a worker accepts (a game state is a few kilobytes)
+_REQUEST_LIMIT = 2**20
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker fails a request that answers with a result."""
+
+
+def rss_kb() -> int:
+    """This process's resident memory in KB (its peak where /proc is unavailable)."""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _Worker:
+    """The pool's view of one worker process."""
+
+    def __init__(self, process, path: Path, ready):
+        self.process = process
+        self.path = path
+        self.ready = ready
+        self.sessions = 0
+        self.rss_kb = 0
+        # A retiring worker takes no new sessions and stops once its last one leaves
+        self.retiring = False
+
+    def wait_ready(self):
+        """Blocks until the worker accepts connections."""
+        while not self.ready.wait(0.5):
+            if not self.process.is_alive():
+                raise ConnectionError(f"the worker exited with code {self.process.exitcode}")
+
+
+class AgentWorkerPool:
+    """
+    Worker processes that host the game agents, so that terminal sessions only
+    render. Each worker runs the model stack once for all its sessions and
+    serves them over a Unix socket, one connection per session, streaming
+    events in their binary form (see `llm.events`). A session sticks to the
+    worker it was given. A worker whose memory passes `max_rss_mb` is replaced:
+    journaled sessions move to another worker at their next request, resuming
+    from their journal, and the old worker stops once the rest have ended.
+    Sessions take their opening scenes from `scene_pool`, if one is given.
+    """
+
+    def __init__(
+        self,
+        workers: int = os.cpu_count() or 1,
+        max_rss_mb: int = DEFAULT_MAX_RSS_MB,
+        scene_pool: Optional[ScenePool] = None,
+    ):
+        self.size = workers
+        self.max_rss_kb = max_rss_mb * 1024
+        self.scene_pool = scene_pool
+        self.recycled = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._directory = Path(tempfile.mkdtemp(prefix="terminal-scroll-workers-"))
+        self._workers: list[_Worker] = []
+        self._sessions: dict[str, _Worker] = {}
+
+    def start(self):
+        """
+        Starts workers until `workers` of them are live (neither retiring nor
+        exited); they load the model stack in parallel.
+        """
+        while len(self._live()) < self.size:
+            self._spawn()
+
+    def wait_ready(self):
+        """Blocks until every worker accepts connections."""
+        for worker in self._live():
+            worker.wait_ready()
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.process.terminate()
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+        self._workers = []
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _spawn(self) -> _Worker:
+        path = self._directory / f"{uuid.uuid4().hex[:8]}.sock"
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(str(path), ready, self.scene_pool),
+            name="agent-worker",
+            daemon=True,
+        )
+        process.start()
+        worker = _Worker(process, path, ready)
+        self._workers.append(worker)
+        return worker
+
+    def _live(self) -> list[_Worker]:
+        return [w for w in self._workers if not w.retiring and w.process.is_alive()]
+
+    def assign(self, session_id: str, movable: bool) -> _Worker:
+        """
+        The worker for a session: the one it already has, unless that worker is
+        retiring and the session can move, else the least loaded live worker.
+        """
+        worker = self._sessions.get(session_id)
+        if worker is not None:
+            alive = worker.process.is_alive()
+            if alive and (not worker.retiring or not movable):
+                return worker
+            self.release(session_id)
+            if not alive:
+                self.lost(worker)
+        self.start()
+        worker = min(self._live(), key=lambda w: w.sessions)
+        worker.sessions += 1
+        self._sessions[session_id] = worker
+        return worker
+
+    def release(self, session_id: str):
+        """Forgets a session; a retiring worker with no sessions left is stopped."""
+        worker = self._sessions.pop(session_id, None)
+        if worker is None:
+            return
+        worker.sessions -= 1
+        if worker.retiring and worker.sessions <= 0:
+            self._stop(worker)
+
+    def report(self, worker: _Worker, rss_kb: int):
+        """Records a worker's memory use and replaces it once over the limit."""
+        worker.rss_kb = rss_kb
+        if rss_kb > self.max_rss_kb and not worker.retiring:
+            self._retire(worker)
+
+    def lost(self, worker: _Worker):
+        """Replaces a worker that exited or dropped a connection unexpectedly."""
+        if not worker.retiring:
+            self._retire(worker)
+
+    def _retire(self, worker: _Worker):
+        worker.retiring = True
+        self.recycled += 1
+        self.start()
+        if worker.sessions <= 0:
+            self._stop(worker)
+
+    def _stop(self, worker: _Worker):
+        if worker in self._workers:
+            worker.process.terminate()
+            self._workers.remove(worker)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._live()),
+            "sessions": len(self._sessions),
+            "recycled": self.recycled,
+            "rss_kb": [w.rss_kb for w in self._workers],
+        }
+
+
+class RemoteAgent:
+    """
+    Stands in for a GameAgent that lives in a worker process of an
+    AgentWorkerPool, with the methods the terminal frontend uses. `state` is
+    the frontend's game state, which it updates from the events as usual; the
+    worker keeps its own copy in step by applying the same events.
+    """
+
+    def __init__(
+        self,
+        pool: AgentWorkerPool,
+        state: GameState,
+        session_id: Optional[str] = None,
+        fast_turns: bool = False,
+        journal_dir: Optional[Path] = DEFAULT_SESSION_DIR,
+    ):
+        self.pool = pool
+        self.state = state
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.fast_turns = fast_turns
+        self.journal_dir = journal_dir
+        self._worker: Optional[_Worker] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._frames = FrameReader()
+        self._pending: list[tuple[int, Event]] = []
+        self._seq = 0
+        # The request awaiting its StreamEnd, sent again if it may not have arrived
+        self._inflight: Optional[dict] = None
+        # The event after which the connection was last reattached
+        self._attached_at: Optional[int] = None
+        self._requests = itertools.count(1)
+        # A cancelled request whose remaining events must be skipped
+        self._draining: Optional[int] = None
+        self._started: Optional[asyncio.Future] = None
+        # Whether the journal holds the session, so another worker can resume it
+        self._journaled = False
+        self._result: Optional[dict] = None
+        self._narration: Optional[str] = None
+
+    @classmethod
+    async def aresume(cls, pool: AgentWorkerPool, session_id: str, **kwargs) -> "RemoteAgent":
+        """Continues a saved session in a worker (see `GameAgent.resume`)."""
+        agent = cls(pool, GameState(), session_id=session_id, **kwargs)
+        try:
+            result = await agent._call({"op": "resume"})
+        except (SessionNotFound, WorkerError):
+            await agent.aclose()
+            raise
+        agent.state = GameState.model_validate(result["state"])
+        agent._narration = result["narration"]
+        agent._journaled = True
+        return agent
+
+    def last_narration(self) -> Optional[str]:
+        return self._narration
+
+    def prefetch_mission(self) -> asyncio.Future:
+        """Creates the session in its worker, which starts loading the mission."""
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._call({"op": "start"}))
+        return self._started
+
+    async def agenerate_opening_scene(self):
+        try:
+            await self.prefetch_mission()
+        except (SessionNotFound, WorkerError) as e:
+            # Let a later call try again
+            self._started = None
+            yield Error(f"Could not start the session: {e}")
+            return
+        async with aclosing(self._stream({"op": "opening_scene"})) as events:
+            async for event in events:
+                if isinstance(event, MissionSet):
+                    self.state.mission_summary = event.summary
+                yield event
+        self._journaled = self.journal_dir is not None
+
+    async def aprocess_user_action(self, user_input: str, game_state: GameState):
+        # Closed at once if the turn is abandoned, so the worker is told to stop
+        async with aclosing(self._stream({"op": "action", "input": user_input})) as events:
+            async for event in events:
+                yield event
+
+    def speculate(self, game_state: GameState, max_actions: int = 3):
+        """Asks the worker to run likely next turns ahead (see `GameAgent.speculate`)."""
+        if self._writer is not None and self._draining is None:
+            self._send({"op": "speculate", "max_actions": max_actions})
+
+    async def aclose(self):
+        """Ends the session in its worker, which then drops its agent."""
+        self._close_session()
+        self.pool.release(self.session_id)
+
+    async def _call(self, request: dict) -> Optional[dict]:
+        """
+        Sends a request that answers with a result rather than events. Raises
+        SessionNotFound if the worker has no such session, and WorkerError if
+        the request failed in any other way.
+        """
+        errors = []
+        async with aclosing(self._stream(request)) as events:
+            async for event in events:
+                if isinstance(event, Error):
+                    errors.append(event.content)
+        missing = (self._result or {}).get("session_not_found")
+        if missing:
+            raise SessionNotFound(missing)
+        if errors:
+            raise WorkerError("; ".join(errors))
+        return self._result
+
+    async def _stream(self, request: dict):
+        """
+        Sends `request` to the session's worker and yields the events of the
+        reply. If the reply is abandoned (the turn is cancelled), the worker is
+        told to stop and the rest of the reply is skipped before the next request.
+        """
+        self._result = None
+        try:
+            await self._connect()
+            request_id = self._send_request(request)
+            done = False
+            try:
+                while True:
+                    event = await self._next_event()
+                    if isinstance(event, StreamEnd):
+                        self._result = event.result
+                        done = True
+                        break
+                    yield event
+            finally:
+                if not done and self._writer is not None:
+                    self._send({"op": "cancel"})
+                    self._draining = request_id
+        except ConnectionError as e:
+            self._disconnect()
+            yield Error(f"Lost the game worker: {e}")
+            return
+        missing = (self._result or {}).get("session_not_found")
+        if missing:
+            yield Error(missing)
+
+    async def _connect(self):
+        """
+        Connects to the session's worker. A journaled session whose worker is
+        being recycled moves to another one, which resumes it from the journal.
+        """
+        if self._writer is not None:
+            await self._drain()
+        worker = self.pool.assign(self.session_id, self._journaled)
+        if worker is self._worker and self._writer is not None:
+            return
+        moving = self._worker is not None and self._journaled
+        self._close_session()
+        try:
+            await asyncio.to_thread(worker.wait_ready)
+        except ConnectionError:
+            self.pool.lost(worker)
+            raise
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            str(worker.path), limit=_REQUEST_LIMIT
+        )
+        self._worker = worker
+        self._frames = FrameReader()
+        self._pending = []
+        self._seq = 0
+        self._attached_at = None
+        if moving:
+            await self._until_end(self._send_request({"op": "resume"}))
+
+    async def _drain(self):
+        """Skips what is left of a cancelled request's reply."""
+        if self._draining is not None:
+            await self._until_end(self._draining)
+            self._draining = None
+
+    async def _until_end(self, request_id: int):
+        while True:
+            event = await self._next_event()
+            if isinstance(event, StreamEnd) and event.request == request_id:
+                self.pool.report(self._worker, event.rss_kb)
+                return
+
+    async def _next_event(self) -> Event:
+        while not self._pending:
+            try:
+                data = await self._reader.read(65536)
+            except ConnectionError:
+                data = b""
+            if not data:
+                await self._reattach()
+                continue
+            self._pending = self._frames.feed(data)
+        seq, event = self._pending.pop(0)
+        if seq != self._seq + 1:
+            raise ConnectionError(f"events {self._seq + 1} to {seq - 1} went missing")
+        self._seq = seq
+        if isinstance(event, StreamEnd):
+            self.pool.report(self._worker, event.rss_kb)
+            if self._inflight is not None and event.request == self._inflight["request"]:
+                self._inflight = None
+        return event
+
+    async def _reattach(self):
+        """
+        Reconnects to the worker after the connection dropped, and picks the
+        session's events up after the last one received. The request in flight
+        is sent again, in case it was lost with the connection; the worker
+        ignores it if it had arrived. Gives up if the worker has exited, or if
+        the connection drops again before any event arrives.
+        """
+        if not self._worker.process.is_alive():
+            self.pool.lost(self._worker)
+            raise ConnectionError("the worker exited")
+        if self._attached_at == self._seq:
+            raise ConnectionError("the worker closed the connection")
+        self._attached_at = self._seq
+        self._writer.close()
+        try:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                str(self._worker.path), limit=_REQUEST_LIMIT
+            )
+        except OSError as e:
+            raise ConnectionError(f"could not reconnect to the worker: {e}") from e
+        self._frames = FrameReader()
+        pending = self._payload(self._inflight) if self._inflight is not None else None
+        self._send({"op": "attach", "after": self._seq, "pending": pending})
+
+    def _send_request(self, request: dict) -> int:
+        """Sends a request that streams a reply, and returns its id."""
+        self._inflight = {**request, "request": next(self._requests)}
+        self._send(self._inflight)
+        return self._inflight["request"]
+
+    def _send(self, request: dict):
+        self._writer.write(json.dumps(self._payload(request)).encode() + b"\n")
+
+    def _payload(self, request: dict) -> dict:
+        payload = {
+            "session_id": self.session_id,
+            "fast_turns": self.fast_turns,
+            "journal_dir": str(self.journal_dir) if self.journal_dir else None,
+            **request,
+        }
+        if request["op"] == "start":
+            payload["state"] = self.state.model_dump(mode="json")
+        return payload
+
+    def _close_session(self):
+        """Tells the worker the session is over here, and disconnects."""
+        if self._writer is not None and not self._writer.is_closing():
+            self._send({"op": "close"})
+        self._disconnect()
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._draining = None
+        self._inflight = None
+
+
+def _worker_main(path: str, ready, scene_pool: Optional[ScenePool]):
+    asyncio.run(_AgentWorker(path, scene_pool).serve(ready))
+
+
+class _Session:
+    """
+    A session in a worker: its agent, its numbered events and the connection
+    they go to. Events sent while no connection is attached are only kept in
+    the stream, for the client to ask for when it reattaches.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.agent = None
+        self.stream = EventStream()
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.running: Optional[asyncio.Task] = None
+        # The latest request started, so a request lost with its connection can be told apart
+        self.last_request = 0
+        self.expiry: Optional[asyncio.Task] = None
+
+    def send(self, event: Event):
+        frame = self.stream.encode(event)
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(frame)
+
+    async def drain(self):
+        if self.writer is not None:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+
+class _AgentWorker:
+    """One worker process: the agents of its sessions and their connections."""
+
+    def __init__(self, path: str, scene_pool: Optional[ScenePool]):
+        # The model stack is only ever imported in the workers
+        from llm.agent import shared_runtime
+
+        self.path = path
+        self.runtime = shared_runtime()
+        self.scene_pool = scene_pool
+        self.sessions: dict[str, _Session] = {}
+
+    async def serve(self, ready):
+        """Serves sessions until the process that started the pool exits."""
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_unix_server(self._handle, path=self.path, limit=_REQUEST_LIMIT)
+        parent_exited = asyncio.Event()
+        # The parent's sentinel becomes readable when it exits, however it exits
+        sentinel = multiprocessing.parent_process().sentinel
+        loop.add_reader(sentinel, lambda: loop.remove_reader(sentinel) and parent_exited.set())
+        ready.set()
+        async with server:
+            await parent_exited.wait()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves one session's connection, one streaming request at a time. A
+        connection either starts the session's events afresh or, after a dropped
+        one, attaches to them where the client left off. The session's agent is
+        dropped when the client closes it, or `RESUME_SECONDS` after its
+        connection drops if no other attaches.
+        """
+        session = None
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                if session is None:
+                    session = self._bind(request, writer)
+                    if session is None:
+                        break
+                match request["op"]:
+                    case "attach":
+                        pending = request["pending"]
+                        # A request sent just before the old connection dropped
+                        if pending and pending["request"] > session.last_request:
+                            await self._start(session, pending)
+                    case "cancel":
+                        if session.running is not None:
+                            session.running.cancel()
+                    case "speculate":
+                        if session.agent is not None:
+                            session.agent.speculate(session.agent.state, request["max_actions"])
+                    case "close":
+                        await self._drop(session)
+                        break
+                    case _:
+                        await self._start(session, request)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            if session is not None and session.writer is writer:
+                session.writer = None
+                if self.sessions.get(session.session_id) is session:
+                    session.expiry = asyncio.create_task(self._expire(session))
+
+    def _bind(self, request: dict, writer: asyncio.StreamWriter) -> Optional[_Session]:
+        """
+        The session a new connection serves, given its first request; None if it
+        asks to attach to events that are no longer kept.
+        """
+        session_id = request["session_id"]
+        session = self.sessions.get(session_id)
+        if request["op"] == "attach":
+            frames = session.stream.since(request["after"]) if session else None
+            if frames is None:
+                return None
+            writer.writelines(frames)
+        else:
+            # Numbered afresh; whatever ran for the old connection is abandoned
+            previous, session = session, _Session(session_id)
+            if previous is not None:
+                session.agent = previous.agent
+                session.running = previous.running
+                self._detach(previous)
+                if previous.running is not None:
+                    previous.running.cancel()
+            self.sessions[session_id] = session
+        self._detach(session)
+        session.writer = writer
+        return session
+
+    def _detach(self, session: _Session):
+        if session.writer is not None:
+            session.writer.close()
+            session.writer = None
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+
+    async def _expire(self, session: _Session):
+        await asyncio.sleep(RESUME_SECONDS)
+        session.expiry = None
+        await self._drop(session)
+
+    async def _drop(self, session: _Session):
+        """Ends a session: its running request is cancelled and its agent closed."""
+        if self.sessions.get(session.session_id) is not session:
+            return
+        del self.sessions[session.session_id]
+        if session.running is not None:
+            session.running.cancel()
+        if session.agent is not None:
+            await session.agent.aclose()
+
+    async def _start(self, session: _Session, request: dict):
+        """Runs a request once the previous one has finished."""
+        session.last_request = request["request"]
+        if session.running is not None:
+            await asyncio.gather(session.running, return_exceptions=True)
+        session.running = asyncio.create_task(self._reply(session, request))
+
+    async def _reply(self, session: _Session, request: dict):
+        """Runs one request, streaming its events, and always ends with StreamEnd."""
+        result = None
+        try:
+            result = await self._run(session, request)
+        except asyncio.CancelledError:
+            pass
+        except SessionNotFound as e:
+            # Told apart from other failures, which arrive as Error events
+            result = {"session_not_found": str(e)}
+        except Exception as e:
+            session.send(Error(f"Worker error: {e}"))
+        session.send(StreamEnd(request["request"], rss_kb(), result))
+        await session.drain()
+
+    async def _run(self, session: _Session, request: dict) -> Optional[dict]:
+        from llm.agent import GameAgent
+        from llm.journal import SessionJournal
+
+        session_id = request["session_id"]
+        journal = (
+            SessionJournal(session_id, Path(request["journal_dir"]))
+            if request["journal_dir"]
+            else None
+        )
+        options = {"pool": self.scene_pool, "fast_turns": request["fast_turns"]}
+        match request["op"]:
+            case "start":
+                agent = GameAgent(
+                    GameState.model_validate(request["state"]),
+                    runtime=self.runtime,
+                    session_id=session_id,
+                    journal=journal,
+                    **options,
+                )
+                agent.prefetch_mission()
+                session.agent = agent
+            case "resume":
+                if journal is None:
+                    raise SessionNotFound(f"Session {session_id} is not journaled")
+                agent = GameAgent.resume(journal, runtime=self.runtime, **options)
+                session.agent = agent
+                return {
+                    "state": agent.state.model_dump(mode="json"),
+                    "narration": agent.last_narration(),
+                }
+            case "opening_scene" | "action" as op:
+                agent = session.agent
+                if agent is None:
+                    raise SessionNotFound(f"Session {session_id} is not running in this worker")
+                events = (
+                    agent.agenerate_opening_scene()
+                    if op == "opening_scene"
+                    else agent.aprocess_user_action(request["input"], agent.state)
+                )
+                character = agent.state.character.model_copy(deep=True)
+                try:
+                    async for event in events:
+                        # Keep the worker's state in step with the frontend's
+                        match event:
+                            case GameStateUpdate():
+                                agent.state.apply(event)
+                            case EndGame():
+                                agent.state.game_over = True
+                        session.send(event)
+                        await session.drain()
+                except asyncio.CancelledError:
+                    # As in the frontend, an abandoned turn leaves no trace
+                    agent.state.character = character
+                    agent.state.game_over = False
+                    raise
+        return None
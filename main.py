@@ -1,33 +1,194 @@
+import argparse
+import asyncio
+import random
+import signal
+from pathlib import Path
+
 import questionary
 from rich.console import Console, Group
+from rich.markup import escape
 from rich.panel import Panel
 
-from data import Character, Environment, GameState, Item
-from llm.characters import characters
-from llm.environments import environments
-from llm.agent import GameAgent
+from components.terminal import CountingOutput, LiveRegion, StatusPane
+from data import Character, Environment, GameState
+from llm.catalog import CHARACTERS, ENVIRONMENTS
+from llm.events import GameStateUpdate, aas_dicts
 from llm.intro import INTRODUCTION_TEXT
+from llm.journal import DEFAULT_SESSION_DIR, SessionJournal, SessionNotFound
+from llm.pool import ScenePool, default_pool
+from llm.stats import StatsLog
+from llm.workers import AgentWorkerPool, RemoteAgent, WorkerError
 
 
 import time
 from rich.text import Text
 
 
+def _warm_up():
+    """
+    Imports the model stack and builds the shared agent runtime. Runs on a worker
+    thread while the intro and menus are on screen.
+    """
+    from llm.agent import shared_runtime
+
+    return shared_runtime()
+
+
 class Game:
-    def __init__(self):
+    def __init__(
+        self,
+        fast_turns: bool = False,
+        console: Console | None = None,
+        interruptible: bool = True,
+        pool: ScenePool | None = None,
+        show_stats: bool = False,
+        stats_log: StatsLog | None = None,
+        speculate: int = 0,
+        journal_dir: Path | None = DEFAULT_SESSION_DIR,
+        resume: str | None = None,
+        agent_pool: AgentWorkerPool | None = None,
+    ):
+        self.fast_turns = fast_turns
+        # Sessions are journaled under `journal_dir` (None turns it off); `resume`
+        # names a saved session to continue instead of starting a new one
+        self.journal_dir = journal_dir
+        self.resume = resume
+        # Number of likely next actions to run ahead while the player types
+        self.speculate = speculate
+        # With a worker pool the agent runs in a worker process and this session
+        # only renders its events
+        self.agent_pool = agent_pool
+        self.show_stats = show_stats
+        self.stats_log = stats_log
+        self.last_stats = None
+        self.route_stats = None
+        self.runtime_stats = None
+        self.pool = pool or default_pool()
+        # Hosted sessions share the process, so SIGINT must not cancel their turns
+        self.interruptible = interruptible
         self.state = GameState()
-        self.console = Console(width=120)
-        self.characters = [Character(**c) for c in characters]
-        self.environments = [Environment(**e) for e in environments]
+        self.console = console or Console(width=120)
+        # Bytes written to the terminal, measured per turn
+        self.output = CountingOutput(self.console.file)
+        self.console.file = self.output
+        self.status_pane = StatusPane(self.console)
+        self._turn_start_bytes = 0
+        self.characters = CHARACTERS
+        self.environments = ENVIRONMENTS
         self.agent = None
+        self._runtime: asyncio.Future | None = None
 
     def run(self):
-        self._setup_game()
-        self._display_opening_scene()
-        self._main_game_loop()
-
-    def _setup_game(self):
+        asyncio.run(self.arun())
+
+    async def arun(self):
+        try:
+            if self.resume:
+                if not await self._resume_game():
+                    return
+            else:
+                await self._setup_game()
+                await self._display_opening_scene()
+            await self._main_game_loop()
+        finally:
+            if self.agent is not None:
+                await self.agent.aclose()
+
+    async def _setup_game(self):
         """Handles the initial game setup and character/environment selection."""
+        # The model stack is slow to import and not needed until a character is
+        # chosen, so it loads in the background while the player reads the intro
+        if not self.agent_pool:
+            self._runtime = asyncio.get_running_loop().run_in_executor(None, _warm_up)
+        self.show_title()
+        await questionary.press_any_key_to_continue("Press any key to begin...").ask_async()
+
+        await self.select_character()
+        journal = SessionJournal.new(self.journal_dir) if self.journal_dir else None
+        if self.agent_pool:
+            self.agent = RemoteAgent(
+                self.agent_pool,
+                self.state,
+                session_id=journal.session_id if journal else None,
+                fast_turns=self.fast_turns,
+                journal_dir=self.journal_dir,
+            )
+        else:
+            # Build the agent while the player is still choosing an environment
+            runtime = await self._runtime
+            from llm.agent import GameAgent
+
+            self.agent = GameAgent(
+                self.state,
+                pool=self.pool,
+                fast_turns=self.fast_turns,
+                runtime=runtime,
+                session_id=journal.session_id if journal else None,
+                journal=journal,
+            )
+        await self.select_environment()
+        self.agent.prefetch_mission()
+
+        self.console.print("\n[bold]Generating your adventure...[/bold]")
+        if journal:
+            self.console.print(
+                f"[dim]Session {journal.session_id}: continue it later with "
+                f"--resume {journal.session_id}[/dim]"
+            )
+        self.console.print()
+
+    async def _resume_game(self) -> bool:
+        """Restores a saved session and shows where the story left off."""
+        if not self.agent_pool:
+            self._runtime = asyncio.get_running_loop().run_in_executor(None, _warm_up)
+        self.show_title()
+        journal_dir = self.journal_dir or DEFAULT_SESSION_DIR
+        try:
+            if self.agent_pool:
+                self.agent = await RemoteAgent.aresume(
+                    self.agent_pool,
+                    self.resume,
+                    fast_turns=self.fast_turns,
+                    journal_dir=journal_dir,
+                )
+            else:
+                runtime = await self._runtime
+                from llm.agent import GameAgent
+
+                self.agent = GameAgent.resume(
+                    SessionJournal(self.resume, journal_dir),
+                    pool=self.pool,
+                    fast_turns=self.fast_turns,
+                    runtime=runtime,
+                )
+        except (SessionNotFound, WorkerError) as e:
+            self.console.print(f"[bold red]{escape(str(e))}[/bold red]")
+            return False
+        self.state = self.agent.state
+
+        self.console.print(
+            Panel(
+                f"[bold]Your Mission:[/] {escape(self.state.mission_description or '')}",
+                title="[bold green]Resumed Mission[/bold green]",
+                border_style="green",
+                expand=False,
+                title_align="left",
+            )
+        )
+        story = self.agent.last_narration()
+        if story:
+            self.console.print(
+                Panel(
+                    Text(story),
+                    border_style="yellow",
+                    title="The Story So Far",
+                    title_align="left",
+                )
+            )
+        return True
+
+    def show_title(self):
+        """Prints the title panel and the introduction."""
         self.console.print(
             Panel(
                 "[bold green]TERMINAL SCROLL[/bold green]",
@@ -36,83 +197,85 @@ class Game:
             ),
         )
         self.console.print(INTRODUCTION_TEXT)
-        questionary.press_any_key_to_continue("Press any key to begin...").ask()
-
-        self.select_character()
-        self.select_environment()
 
-        self.agent = GameAgent(self.state)
-        self.console.print("\n[bold]Generating your adventure...[/bold]\n")
-
-    def _display_opening_scene(self):
+    async def _display_opening_scene(self):
         """Generates and displays the opening scene."""
         scene_text = Text()
-        scene_generator = self.agent.generate_opening_scene()
-
-        for event in scene_generator:
-            match event.get("type"):
-                case "mission_set":
-                    # The agent has already updated its internal state
-                    self.state.mission_description = event.get("data")
-                    self.state.mission_summary = self.agent.state.mission_summary
-                    self.console.print(
-                        Panel(
-                            f"[bold]Your Mission:[/] {self.state.mission_description}",
-                            title="[bold green]New Mission[/bold green]",
-                            border_style="green",
-                            expand=False,
-                            title_align="left",
-                        )
-                    )
-                case "text":
-                    scene_text.append(event.get("content", ""))
+        # The handlers take events in their dict form
+        scene_generator = aas_dicts(self.agent.agenerate_opening_scene())
 
-        # Render the final scene panel
-        self.console.print(
-            Panel(
-                scene_text,
-                border_style="yellow",
-                title="Your Adventure Begins",
-                title_align="left",
-            )
+        region = None
+        try:
+            async for event in scene_generator:
+                match event.get("type"):
+                    case "mission_set":
+                        # The agent has already updated its internal state
+                        self.state.mission_description = event.get("data")
+                        self.state.mission_summary = self.agent.state.mission_summary
+                        self.console.print(
+                            Panel(
+                                f"[bold]Your Mission:[/] {escape(self.state.mission_description or '')}",
+                                title="[bold green]New Mission[/bold green]",
+                                border_style="green",
+                                expand=False,
+                                title_align="left",
+                            )
+                        )
+                        # Stream the scene into a live panel below the mission
+                        region = LiveRegion(self.console, self._scene_panel(scene_text))
+                        region.start()
+                    case "text_delta":
+                        self._handle_text_delta(event, scene_text)
+                    case "text":
+                        self._handle_text(event, scene_text)
+                    case "error":
+                        self._handle_error(event)
+                if region:
+                    region.update(self._scene_panel(scene_text))
+        finally:
+            if region:
+                region.stop()
+
+    def _scene_panel(self, scene_text):
+        return Panel(
+            scene_text,
+            border_style="yellow",
+            title="Your Adventure Begins",
+            title_align="left",
         )
 
-    def _main_game_loop(self):
+    async def _main_game_loop(self):
         """Runs the main game loop where the player interacts with the game."""
         while not self.state.game_over:
-            self.console.print(self.get_status_text())
+            self._turn_start_bytes = self.output.bytes
+            # An unchanged status is not printed again
+            self.status_pane.show(
+                self.get_status_text(),
+                border_style="blue",
+                title="You",
+                title_align="left",
+                expand=False,
+            )
 
-            user_input = questionary.text(">", qmark="").ask()
+            if self.speculate:
+                self.agent.speculate(self.state, self.speculate)
+            user_input = await questionary.text(">", qmark="").ask_async()
 
             if user_input is None or user_input.lower() in ["quit", "exit"]:
                 break
 
-            story_text = Text()
-            response_generator = self.agent.process_user_action(
-                user_input, self.state
-            )
-
-            for event in response_generator:
-                match event.get("type"):
-                    case "game_state_update":
-                        self._handle_game_state_update(event)
-                    case "dice_roll_result":
-                        self._handle_dice_roll_result(event)
-                    case "end_game":
-                        self._handle_end_game(event)
-                    case "text":
-                        self._handle_text(event, story_text)
-
-            # Render the final story panel after the stream is complete
-            if story_text:
-                self.console.print(
-                    Panel(
-                        story_text,
-                        border_style="yellow",
-                        title="Story",
-                        title_align="left",
-                    )
-                )
+            # Ctrl-C during a turn cancels only that turn, not the session
+            turn = asyncio.create_task(self._play_turn(user_input))
+            interruptible = self.interruptible and self._cancel_on_interrupt(turn)
+            try:
+                await turn
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                self.console.print("[dim]Turn cancelled.[/dim]")
+            finally:
+                if interruptible:
+                    asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
 
         self.console.print(
             Panel(
@@ -123,6 +286,57 @@ class Game:
             )
         )
 
+    async def _play_turn(self, user_input: str):
+        """Streams one turn's events into a live story panel."""
+        story_text = Text()
+        response_generator = aas_dicts(self.agent.aprocess_user_action(user_input, self.state))
+        render_seconds = 0.0
+        turn_stats = None
+        # A cancelled turn is dropped from the story, so its state changes go too
+        character = self.state.character.model_copy(deep=True)
+
+        # Stream the story into a live panel as tokens arrive; repaints are
+        # coalesced and only rewrite the lines that changed
+        with LiveRegion(self.console, self._story_panel(story_text)) as region:
+            try:
+                async for event in response_generator:
+                    render_start = time.perf_counter()
+                    match event.get("type"):
+                        case "game_state_update":
+                            self._handle_game_state_update(event)
+                        case "dice_roll_result":
+                            self._handle_dice_roll_result(event)
+                        case "end_game":
+                            self._handle_end_game(event)
+                        case "text_delta":
+                            self._handle_text_delta(event, story_text)
+                        case "text":
+                            self._handle_text(event, story_text)
+                        case "error":
+                            self._handle_error(event)
+                        case "route_stats":
+                            self.route_stats = event.get("data")
+                        case "runtime_stats":
+                            self.runtime_stats = event.get("data")
+                        case "turn_stats":
+                            turn_stats = event.get("data", {})
+                    region.update(self._story_panel(story_text))
+                    render_seconds += time.perf_counter() - render_start
+            except asyncio.CancelledError:
+                self.state.character = character
+                self.state.game_over = False
+                raise
+        if turn_stats is not None:
+            self._handle_turn_stats(turn_stats, render_seconds, region)
+
+    def _cancel_on_interrupt(self, task: asyncio.Task) -> bool:
+        """Routes SIGINT to cancelling `task`; returns False where unsupported."""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
     def _handle_end_game(self, event):
         """Handles the end of the game."""
         self.state.game_over = True
@@ -135,7 +349,7 @@ class Game:
 
         self.console.print(
             Panel(
-                reason,
+                escape(reason),
                 title=title,
                 border_style=border_style,
                 expand=False,
@@ -146,32 +360,15 @@ class Game:
 
     def _handle_game_state_update(self, event):
         """Handles and displays game state updates."""
-        update_data = event.get("data", {})
+        update = GameStateUpdate.from_data(event.get("data", {}))
+        self.state.apply(update)
         update_messages = []
-        if "feeling" in update_data:
-            new_feeling = update_data["feeling"]
-            if new_feeling:
-                self.state.character.feeling = new_feeling
-                update_messages.append(f"[bold]New Feeling:[/] {new_feeling}")
-        if "new_item" in update_data:
-            item_data = update_data["new_item"]
-            if item_data:
-                self.state.character.items.append(
-                    Item(
-                        name=item_data.get("name"),
-                        description=item_data.get("description"),
-                    )
-                )
-                update_messages.append(
-                    f"[bold]Item Acquired:[/] {item_data.get('name')}"
-                )
-        if "embarrassment" in update_data:
-            points = update_data["embarrassment"]
-            if points:
-                self.state.character.embarrassment += points
-                update_messages.append(
-                    f"[bold]Embarrassment +{points}![/]"
-                )
+        if update.feeling:
+            update_messages.append(f"[bold]New Feeling:[/] {escape(update.feeling)}")
+        if update.new_item_name:
+            update_messages.append(f"[bold]Item Acquired:[/] {escape(update.new_item_name)}")
+        if update.embarrassment:
+            update_messages.append(f"[bold]Embarrassment +{update.embarrassment}![/]")
 
         if update_messages:
             self.console.print(
@@ -192,7 +389,7 @@ class Game:
         sides = data.get("sides", "N/A")
         self.console.print(
             Panel(
-                f"[bold]Reason:[/] {reason}\n[bold]Roll:[/] {roll} (d{sides})",
+                f"[bold]Reason:[/] {escape(str(reason))}\n[bold]Roll:[/] {roll} (d{sides})",
                 title="[bold cyan]Dice Roll[/bold cyan]",
                 border_style="cyan",
                 expand=False,
@@ -200,37 +397,143 @@ class Game:
             )
         )
 
-    def _handle_text(self, event, story_text):
-        """Appends text to the story."""
+    def _handle_turn_stats(self, data: dict, render_seconds: float, region: LiveRegion):
+        """
+        Adds the frontend's render time, paints and terminal bytes (status panel
+        included) to the turn stats and exports them.
+        """
+        self.last_stats = {
+            **data,
+            "render_ms": round((render_seconds + region.paint_seconds) * 1000, 2),
+            "render_paints": region.paints,
+            "render_bytes": self.output.bytes - self._turn_start_bytes,
+        }
+        if self.stats_log:
+            self.stats_log.write(
+                self.agent.session_id,
+                {**self.last_stats, "routes": self.route_stats, "runtime": self.runtime_stats},
+            )
+
+    def _handle_error(self, event):
+        """Shows a failed scene or turn; the player can try the action again."""
+        self.console.print(
+            Panel(
+                escape(event.get("content", "Something went wrong.")),
+                title="[bold red]Error[/bold red]",
+                border_style="red",
+                expand=False,
+                title_align="left",
+            )
+        )
+
+    def _handle_text_delta(self, event, story_text):
+        """Appends a streamed token to the story."""
         story_text.append(event.get("content", ""))
 
-    def get_status_text(self):
+    def _handle_text(self, event, story_text):
+        """Shows whatever part of the final text was not streamed."""
+        content = event.get("content", "")
+        if content.startswith(story_text.plain):
+            story_text.append(content[len(story_text.plain):])
+
+    def _story_panel(self, story_text):
+        return Panel(
+            story_text,
+            border_style="yellow",
+            title="Story",
+            title_align="left",
+        )
+
+    def get_status_text(self) -> str:
         char_name = (
             f"{self.state.character.name} the {self.state.character.class_name}"
             if self.state.character
             else "N/A"
         )
         env_name = self.state.environment.name if self.state.environment else "N/A"
-        feeling = self.state.character.feeling if self.state.character else "N/A"
+        feeling = escape(self.state.character.feeling) if self.state.character else "N/A"
         embarrassment = self.state.character.embarrassment if self.state.character else "N/A"
-        mission = self.state.mission_summary if self.state.mission_summary else "N/A"
+        mission = escape(self.state.mission_summary) if self.state.mission_summary else "N/A"
         status_text = f"""[bold blue]Character:[/] [cyan]{char_name}[/]
 [bold blue]Environment:[/] [cyan]{env_name}[/]
 [bold blue]Feeling:[/] [cyan]{feeling}[/]
 [bold red]Embarrassment:[/] [cyan]{embarrassment}/10[/]
 [bold green]Mission:[/] [cyan]{mission}[/]"""
-        return Panel(
-            status_text,
-            border_style="blue",
-            title="You",
-            title_align="left",
-            expand=False,
+        if self.show_stats and self.last_stats:
+            status_text += "\n" + self._stats_text(self.last_stats)
+        return status_text
+
+    def _stats_text(self, stats: dict) -> str:
+        """Formats the last turn's stats for the status panel."""
+        first_token = stats.get("first_token_ms")
+        tools = ", ".join(f"{t['tool']} {t['ms']:.0f}ms" for t in stats.get("tool_ms", []))
+        recall = (
+            f", recall {stats.get('recall_tokens', 0)} ({stats['recall_snippets']} details)"
+            if stats.get("recall_snippets")
+            else ""
+        )
+        return (
+            f"[dim]Last turn{' (speculated)' if stats.get('speculated') else ''}: "
+            f"{stats.get('total_ms', 0):.0f}ms total, "
+            f"first token {f'{first_token:.0f}ms' if first_token is not None else 'N/A'}, "
+            f"{stats.get('hops', 0)} model hop(s), render {stats.get('render_ms', 0):.0f}ms "
+            f"({stats.get('render_paints', 0)} paints, {stats.get('render_bytes', 0)} bytes)\n"
+            f"Tokens: {stats.get('prompt_tokens', 0)} prompt "
+            f"({stats.get('cached_tokens', 0)} cached), "
+            f"{stats.get('completion_tokens', 0)} completion, "
+            f"state {stats.get('state_tokens', 0)}/{stats.get('state_full_tokens', 0)}"
+            f"{recall}"
+            f"{f'; tools: {tools}' if tools else ''}"
+            f"{self._attempts_text(stats)}{self._routes_text()}{self._runtime_text()}[/dim]"
+        )
+
+    def _attempts_text(self, stats: dict) -> str:
+        """Formats the turn's retries, hedges and timeouts, if there were any."""
+        extra = {
+            name: stats.get(name, 0)
+            for name in ("retries", "hedges", "timeouts")
+            if stats.get(name, 0)
+        }
+        if not extra:
+            return ""
+        counts = ", ".join(f"{count} {name}" for name, count in extra.items())
+        return f"\nCalls: {stats.get('attempts', 0)} attempt(s), {counts}"
+
+    def _routes_text(self) -> str:
+        """Formats the per-route model latency and cost totals for the status panel."""
+        lines = []
+        for route, data in (self.route_stats or {}).items():
+            models = ", ".join(
+                f"{m['model']} {m['calls']} call(s) p95 {m['total_ms_p95']:.0f}ms "
+                f"${m['cost_usd']:.4f}"
+                for m in data["models"]
+                if m["calls"] or m["failures"]
+            )
+            if models:
+                fallbacks = f", {data['fallbacks']} fallback(s)" if data["fallbacks"] else ""
+                lines.append(f"\n{route.capitalize()}: {models}{fallbacks}")
+        return "".join(lines)
+
+    def _runtime_text(self) -> str:
+        """Formats the scheduler queue and the call totals shared by the process."""
+        if not self.runtime_stats:
+            return ""
+        scheduler = self.runtime_stats["scheduler"]
+        calls = self.runtime_stats["calls"]
+        queued = ", ".join(f"{count} {priority}" for priority, count in scheduler["queued"].items())
+        return (
+            f"\nScheduler: {scheduler['in_flight']} in flight, queued {queued}, "
+            f"wait p50 {scheduler['wait_ms_p50']:.0f}ms max {scheduler['wait_ms_max']:.0f}ms, "
+            f"{scheduler['rejected']} rejected; calls {calls.get('attempts', 0)} attempt(s), "
+            f"{calls.get('retries', 0)} retries, {calls.get('timeouts', 0)} timeouts"
         )
 
-    def select_character(self):
+    async def select_character(self):
         self.console.print()
         choices = [f"{char.name} the {char.class_name}" for char in self.characters]
-        selection = questionary.select("Choose your character:", choices=choices).ask()
+        selection = await questionary.select(
+            "Choose your character:", choices=choices
+        ).ask_async()
 
         if selection:
             name, _, class_name = selection.partition(" the ")
@@ -243,23 +546,69 @@ class Game:
                 None,
             )
             if selected_character:
-                self.state.character = selected_character
+                # The catalog is shared, so play on a private copy
+                self.state.character = selected_character.model_copy(deep=True)
 
-    def select_environment(self):
+    async def select_environment(self):
         self.console.print()
         choices = [env.name for env in self.environments]
-        selection = questionary.select(
+        selection = await questionary.select(
             "Choose your environment:", choices=choices
-        ).ask()
+        ).ask_async()
 
         if selection:
             selected_environment = next(
                 (env for env in self.environments if env.name == selection), None
             )
             if selected_environment:
-                self.state.environment = selected_environment
+                self.state.environment = selected_environment.model_copy(deep=True)
 
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Terminal Scroll")
+    parser.add_argument(
+        "--fast-turns",
+        action="store_true",
+        help="Resolve each turn with one structured model call instead of the tool agent.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Show per-turn latency and token stats in the status panel.",
+    )
+    parser.add_argument(
+        "--stats-file",
+        type=Path,
+        help="Append per-turn stats to this JSONL file.",
+    )
+    parser.add_argument(
+        "--speculate",
+        type=int,
+        nargs="?",
+        const=3,
+        default=0,
+        metavar="N",
+        help="Run the turns for N (default 3) likely next actions while you type.",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION_ID",
+        help="Continue a saved session instead of starting a new one.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed the dice, so a replayed session (LLM_CACHE_MODE=replay) repeats exactly.",
+    )
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    game = Game(
+        fast_turns=args.fast_turns,
+        show_stats=args.stats,
+        stats_log=StatsLog(args.stats_file) if args.stats_file else None,
+        speculate=args.speculate,
+        resume=args.resume,
+    )
     game.run()
@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import threading
+
+from prompt_toolkit.application import get_app_session
+from prompt_toolkit.contrib.telnet.server import TelnetServer
+from rich.console import Console
+
+from llm.pool import default_pool
+from llm.workers import DEFAULT_MAX_RSS_MB, AgentWorkerPool
+from main import Game
+
+
+class _SessionOutput:
+    """
+    File-like object that lets a Rich console write to one connection's terminal.
+    The game, live story panel included, writes from the event loop that owns the
+    connection; a write from any other thread is handed over to that loop.
+    """
+
+    def __init__(self, output, loop: asyncio.AbstractEventLoop):
+        self.output = output
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def write(self, text: str) -> int:
+        if threading.get_ident() == self._loop_thread:
+            self._send(text)
+        else:
+            self.loop.call_soon_threadsafe(self._send, text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return True
+
+    def _send(self, text: str):
+        self.output.write_raw(text)
+        self.output.flush()
+
+
+class GameServer:
+    """
+    Hosts one Game per connection in this process. Every session shares the same
+    agent runtime (model client, connection pool, compiled turn graph), scene pool
+    and catalog, so per-player cost is just the game state and its history. With
+    an `agent_pool` the agents run in its worker processes instead, and this
+    process only renders.
+    """
+
+    def __init__(self, fast_turns: bool = False, agent_pool: AgentWorkerPool | None = None):
+        self.fast_turns = fast_turns
+        self.pool = default_pool()
+        self.agent_pool = agent_pool
+
+    async def interact(self, connection):
+        """Runs a full game on the connection's terminal."""
+        output = get_app_session().output
+        console = Console(
+            file=_SessionOutput(output, asyncio.get_running_loop()),
+            width=min(output.get_size().columns, 120),
+            force_terminal=True,
+        )
+        game = Game(
+            fast_turns=self.fast_turns,
+            console=console,
+            interruptible=False,
+            pool=self.pool,
+            agent_pool=self.agent_pool,
+        )
+        await game.arun()
+
+    async def serve_telnet(self, host: str, port: int):
+        await TelnetServer(interact=self.interact, host=host, port=port).run()
+
+    async def serve_ssh(self, host: str, port: int, host_key: str):
+        # asyncssh is only needed for SSH hosting, so it is imported on demand
+        import asyncssh
+        from prompt_toolkit.contrib.ssh import PromptToolkitSSHServer
+
+        await asyncssh.create_server(
+            lambda: PromptToolkitSSHServer(interact=self.interact),
+            host,
+            port,
+            server_host_keys=[host_key],
+        )
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Terminal Scroll games over the network.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2323)
+    parser.add_argument(
+        "--ssh-host-key",
+        help="Serve over SSH with this host key (requires asyncssh) instead of telnet.",
+    )
+    parser.add_argument("--fast-turns", action="store_true")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Run the game agents in N worker processes (0 runs them in this one).",
+    )
+    parser.add_argument(
+        "--worker-max-rss",
+        type=int,
+        default=DEFAULT_MAX_RSS_MB,
+        metavar="MB",
+        help="Replace a worker once its resident memory passes this many megabytes.",
+    )
+    args = parser.parse_args()
+
+    agent_pool = None
+    if args.workers:
+        # Start the workers before the first player connects
+        agent_pool = AgentWorkerPool(
+            args.workers, max_rss_mb=args.worker_max_rss, scene_pool=default_pool()
+        )
+        agent_pool.start()
+        agent_pool.wait_ready()
+    else:
+        from llm.agent import shared_runtime
+
+        # Build the shared runtime before the first player connects
+        shared_runtime()
+    server = GameServer(fast_turns=args.fast_turns, agent_pool=agent_pool)
+    try:
+        if args.ssh_host_key:
+            asyncio.run(server.serve_ssh(args.host, args.port, args.ssh_host_key))
+        else:
+            asyncio.run(server.serve_telnet(args.host, args.port))
+    finally:
+        if agent_pool:
+            agent_pool.shutdown()
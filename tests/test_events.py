@@ -0,0 +1,21 @@
+from llm.events import EventStream, FrameReader, TextDelta
+
+
+def test_stream_replays_the_frames_after_a_seq():
+    stream = EventStream(keep=3)
+    for i in range(5):
+        stream.encode(TextDelta(str(i)))
+
+    replayed = FrameReader().feed(b"".join(stream.since(2)))
+
+    assert [(seq, event.content) for seq, event in replayed] == [(3, "2"), (4, "3"), (5, "4")]
+    assert stream.since(5) == []
+
+
+def test_stream_cannot_replay_frames_it_no_longer_keeps():
+    stream = EventStream(keep=3)
+    for i in range(5):
+        stream.encode(TextDelta(str(i)))
+
+    assert stream.since(1) is None
+    assert stream.since(6) is None
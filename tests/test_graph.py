@@ -0,0 +1,42 @@
+import asyncio
+
+from data import GameState
+from llm.agent import AgentRuntime, GameAgent
+from llm.catalog import CHARACTERS, ENVIRONMENTS
+from llm.fake import ScriptedChatModel, demo_scripts
+from llm.graph import HOP_SEPARATOR
+from llm.scheduler import LLMScheduler
+
+
+def test_multi_hop_turn_keeps_every_hop_narration():
+    scripts = demo_scripts()
+    scripts[""] = [
+        {
+            "content": "You swing your sword wildly at the goblin.",
+            "tool_calls": [{"name": "roll_dice", "args": {"reason": "Swing the sword"}}],
+        },
+        "The blade connects and the goblin flees.",
+    ]
+    runtime = AgentRuntime(
+        llm=ScriptedChatModel(scripts=scripts),
+        scheduler=LLMScheduler(requests_per_minute=10**9, tokens_per_minute=10**12),
+    )
+    state = GameState(
+        character=CHARACTERS[0].model_copy(deep=True),
+        environment=ENVIRONMENTS[0].model_copy(deep=True),
+    )
+    agent = GameAgent(state, runtime=runtime)
+    list(agent.generate_opening_scene())
+
+    events = list(agent.process_user_action("I attack the goblin", state))
+    asyncio.run(runtime.aclose())
+
+    narration = (
+        f"You swing your sword wildly at the goblin.{HOP_SEPARATOR}"
+        "The blade connects and the goblin flees."
+    )
+    streamed = "".join(event.content for event in events if event.type == "text_delta")
+    final = [event.content for event in events if event.type == "text"]
+    assert streamed == narration
+    assert final == [narration]
+    assert agent.last_narration() == narration
@@ -0,0 +1,78 @@
+import asyncio
+
+from llm.fake import ScriptedChatModel
+from llm.resilience import CallPolicy, ResilientChatModel
+from llm.scheduler import LLMScheduler, ScheduledChatModel
+
+
+class FlakyChatModel(ScriptedChatModel):
+    """Scripted model whose first `failures` calls fail with a retryable error."""
+
+    failures: int = 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._fail()
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._fail()
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset by peer")
+
+
+def _stack(scheduler: LLMScheduler, failures: int):
+    """The runtime's model stack: a scheduler slot around the retrying model."""
+    model = ResilientChatModel(
+        inner=FlakyChatModel(scripts={"": ["The goblin flees."]}, failures=failures),
+        policy=CallPolicy(retries=2, base_delay=0),
+        scheduler=scheduler,
+    )
+    return ScheduledChatModel(inner=model, scheduler=scheduler)
+
+
+def _count_request_charges(scheduler: LLMScheduler) -> list:
+    charges = []
+    take = scheduler.requests.take
+
+    def counting_take(amount):
+        charges.append(amount)
+        take(amount)
+
+    scheduler.requests.take = counting_take
+    return charges
+
+
+def test_each_retry_is_charged_to_the_rate_limits():
+    scheduler = LLMScheduler()
+    charges = _count_request_charges(scheduler)
+
+    assert _stack(scheduler, failures=2).invoke("I attack").content == "The goblin flees."
+    scheduler.close()
+
+    assert len(charges) == 3
+    assert scheduler.metrics()["granted"] == 1
+    assert scheduler.metrics()["charged"] == 2
+
+
+def test_each_async_retry_is_charged_to_the_rate_limits():
+    scheduler = LLMScheduler()
+    charges = _count_request_charges(scheduler)
+
+    response = asyncio.run(_stack(scheduler, failures=1).ainvoke("I attack"))
+    scheduler.close()
+
+    assert response.content == "The goblin flees."
+    assert len(charges) == 2
+    assert scheduler.metrics()["charged"] == 1
+
+
+def test_close_stops_the_dispatcher():
+    scheduler = LLMScheduler()
+
+    scheduler.close()
+
+    assert not scheduler._dispatcher.is_alive()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from llm.speculation import COMMON_ACTIONS, SpeculativeTurns, actions_match
+
+
+@pytest.mark.parametrize(
+    "typed, predicted",
+    [
+        ("look around please", "Look around"),
+        ("Talk to the goose.", "talk goose"),
+        ("open the chest", "Open chest"),
+    ],
+)
+def test_same_action_in_other_words_matches(typed, predicted):
+    assert actions_match(typed, predicted)
+
+
+@pytest.mark.parametrize(
+    "typed, predicted",
+    [
+        ("go east", "go west"),
+        ("attack the orc", "attack the ogre"),
+        ("take key", "take keg"),
+        ("open the door", "open the door and run"),
+        ("", "look around"),
+    ],
+)
+def test_near_miss_actions_do_not_match(typed, predicted):
+    assert not actions_match(typed, predicted)
+
+
+async def _nothing():
+    return
+    yield
+
+
+def test_near_miss_is_not_served():
+    async def play():
+        turns = SpeculativeTurns()
+
+        async def predict():
+            return ["go west"]
+
+        turns.start(predict, lambda speculation: _nothing(), max_actions=3)
+        await turns._predicting
+        return turns.claim("go east")
+
+    assert asyncio.run(play()) is None
+
+
+def test_common_actions_start_even_when_predictions_fill_every_slot():
+    async def play():
+        turns = SpeculativeTurns()
+
+        async def predict():
+            return ["leap over the hedge", "talk to the goose", "open the chest"]
+
+        turns.start(predict, lambda speculation: _nothing(), max_actions=2)
+        await turns._predicting
+        actions = [speculation.action for speculation in turns._speculations]
+        turns.cancel()
+        return actions
+
+    assert asyncio.run(play()) == [*COMMON_ACTIONS, "leap over the hedge"]